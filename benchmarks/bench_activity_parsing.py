@@ -0,0 +1,71 @@
+"""
+Benchmark the ingestion of the activities received in /api/messages: JSON decoding,
+logging and deserialization, as done before (json + print + msrest) and now (orjson
+when available + level-gated logging + compiled, lazy deserialization).
+
+The payloads in benchmarks/activities are Teams activities with the identifiers
+replaced by fake ones.
+
+Usage: WebhookUrl=https://localhost python benchmarks/bench_activity_parsing.py [iterations]
+"""
+
+import contextlib
+import glob
+import io
+import json
+import logging
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from botbuilder.schema import Activity
+
+from bots.activity import loads, orjson, parse_activity
+
+ACTIVITIES = os.path.join(os.path.dirname(__file__), "activities", "*.json")
+LOGGER = logging.getLogger("bench")
+
+
+def msrest_path(raw_body: bytes) -> Activity:
+    body = json.loads(raw_body)
+    print(f"\nAPI: Received activity: {body}")
+    return Activity().deserialize(body)
+
+
+def fast_path(raw_body: bytes) -> Activity:
+    if LOGGER.isEnabledFor(logging.DEBUG):
+        LOGGER.debug("API: Received activity: %s", raw_body.decode("utf-8"))
+    return parse_activity(loads(raw_body))
+
+
+def measure(func, raw_body: bytes, iterations: int) -> float:
+    start = time.perf_counter()
+    # The printed output isn't part of what we measure, but formatting it is
+    with contextlib.redirect_stdout(io.StringIO()):
+        for _ in range(iterations):
+            func(raw_body)
+    return (time.perf_counter() - start) / iterations
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    print(f"JSON decoder: {'orjson' if orjson else 'json'}")
+    for path in sorted(glob.glob(ACTIVITIES)):
+        with open(path, "rb") as activity_file:
+            raw_body = activity_file.read()
+        assert (
+            fast_path(raw_body).serialize()
+            == Activity().deserialize(json.loads(raw_body)).serialize()
+        )
+        before = measure(msrest_path, raw_body, iterations)
+        after = measure(fast_path, raw_body, iterations)
+        print(
+            f"{os.path.basename(path):30} msrest: {before * 1e6:7.1f}us"
+            f"  fast: {after * 1e6:7.1f}us  ({before / after:.1f}x)"
+        )
+
+
+if __name__ == "__main__":
+    main()
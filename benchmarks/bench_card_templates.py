@@ -0,0 +1,65 @@
+"""
+Benchmark rendering the user mention card: reading and patching the template file on
+every render versus the compiled template.
+
+Usage: python benchmarks/bench_card_templates.py [renders]
+"""
+
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from utils.card_templates import CardTemplateStore
+
+RESOURCES = os.path.join(os.path.dirname(__file__), "..", "resources")
+TEMPLATE = "UserMentionCardTemplate"
+VALUES = {
+    "userName": "Adele Vance",
+    "userUPN": "AdeleV@contoso.onmicrosoft.com",
+    "userAAD": "87d349ed-44d7-43e1-9a83-5f2406dee5bd",
+}
+
+
+def render_from_disk() -> dict:
+    with open(os.path.join(RESOURCES, f"{TEMPLATE}.json"), "rb") as in_file:
+        template_json = json.load(in_file)
+    for t in template_json["body"]:
+        t["text"] = t["text"].replace("${userName}", VALUES["userName"])
+    for e in template_json["msteams"]["entities"]:
+        e["text"] = e["text"].replace("${userName}", VALUES["userName"])
+        e["mentioned"]["id"] = e["mentioned"]["id"].replace(
+            "${userUPN}", VALUES["userUPN"]
+        )
+        e["mentioned"]["id"] = e["mentioned"]["id"].replace(
+            "${userAAD}", VALUES["userAAD"]
+        )
+        e["mentioned"]["name"] = e["mentioned"]["name"].replace(
+            "${userName}", VALUES["userName"]
+        )
+    return template_json
+
+
+def main():
+    renders = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    store = CardTemplateStore(RESOURCES)
+    store.load()
+    assert store.render(TEMPLATE, **VALUES) == render_from_disk()
+
+    start = time.perf_counter()
+    for _ in range(renders):
+        render_from_disk()
+    elapsed = time.perf_counter() - start
+    print(f"disk + replace: {renders / elapsed:10.0f} renders/s")
+
+    start = time.perf_counter()
+    for _ in range(renders):
+        store.render(TEMPLATE, **VALUES)
+    elapsed = time.perf_counter() - start
+    print(f"compiled:       {renders / elapsed:10.0f} renders/s")
+
+
+if __name__ == "__main__":
+    main()
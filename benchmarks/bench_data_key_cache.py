@@ -0,0 +1,60 @@
+"""
+Benchmark the notification dataKey cache on synthetic batches.
+
+Usage: python benchmarks/bench_data_key_cache.py [batch_size] [distinct_keys]
+"""
+
+import base64
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.asymmetric import padding, rsa
+
+from utils import crypto
+
+
+def make_batch(public_key, batch_size: int, distinct_keys: int) -> list[str]:
+    data_keys = []
+    for _ in range(distinct_keys):
+        encrypted = public_key.encrypt(
+            os.urandom(32),
+            padding.OAEP(
+                mgf=padding.MGF1(algorithm=hashes.SHA1()),
+                algorithm=hashes.SHA1(),
+                label=None,
+            ),
+        )
+        data_keys.append(base64.b64encode(encrypted).decode("utf-8"))
+    return [data_keys[i % distinct_keys] for i in range(batch_size)]
+
+
+def run(label: str, decrypt, batch: list[str]) -> None:
+    start = time.perf_counter()
+    for data_key in batch:
+        decrypt(data_key, "bench")
+    elapsed = time.perf_counter() - start
+    print(f"{label:>10}: {len(batch) / elapsed:10.0f} notifications/s")
+
+
+def main():
+    batch_size = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    distinct_keys = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+
+    private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    crypto.NOTIFICATION_KEYS._keys["bench"] = private_key
+    crypto.NOTIFICATION_KEYS._checked_at = float("inf")
+    batch = make_batch(private_key.public_key(), batch_size, distinct_keys)
+
+    print(f"Batch of {batch_size} notifications with {distinct_keys} distinct keys")
+    run("no cache", crypto._rsa_decrypt_symmetric_key, batch)
+    crypto.SYMMETRIC_KEYS.clear()
+    run("cache", crypto._decrypt_symmetric_key, batch)
+    print(f"{'stats':>10}: {crypto.SYMMETRIC_KEYS.stats()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""
+Benchmark the notification spool: append (with batched fsync) and replay throughput.
+
+Usage: python benchmarks/bench_spool.py [records] [batch_size]
+"""
+
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from utils.spool import Spool
+
+NOTIFICATION = {
+    "subscriptionId": "00000000-0000-0000-0000-000000000000",
+    "changeType": "created",
+    "resource": "chats('19:chat@thread.v2')/messages('1700000000000')",
+    "clientState": "secret",
+    "encryptedContent": {"data": "A" * 2048, "dataKey": "B" * 344},
+}
+
+
+async def main():
+    records = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    batch_size = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+
+    with tempfile.TemporaryDirectory() as directory:
+        spool = Spool(directory, segment_size=4 * 1024 * 1024, fsync_interval=0.002)
+        start = time.perf_counter()
+        for _ in range(records // batch_size):
+            await asyncio.gather(
+                *(spool.append(NOTIFICATION) for _ in range(batch_size))
+            )
+        elapsed = time.perf_counter() - start
+        print(f"append: {records / elapsed:10.0f} records/s ({spool.stats()})")
+        await spool.close()
+
+        start = time.perf_counter()
+        spool = Spool(directory, segment_size=4 * 1024 * 1024, fsync_interval=0.002)
+        replayed = 0
+        async for seq, _ in spool.replay():
+            spool.ack(seq)
+            replayed += 1
+        elapsed = time.perf_counter() - start
+        print(f"replay: {replayed / elapsed:10.0f} records/s ({spool.stats()})")
+        await spool.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -3,9 +3,12 @@
 from .apps import add_bot
 from .chat_info import chat_info
 from .dump import dump_token
+from .messages import export_chat_messages
 from .subscriptions import (
     create_chat_messages_subscription,
+    create_chat_messages_subscriptions,
     delete_chat_messages_subscription,
+    delete_chat_messages_subscriptions,
     get_lifecycle_notifications,
     get_notifications,
     list_chat_messages_subscription,
@@ -14,10 +17,13 @@ from .subscriptions import (
 __all__ = [
     "dump_token",
     "chat_info",
+    "export_chat_messages",
     "add_bot",
     "list_chat_messages_subscription",
     "create_chat_messages_subscription",
     "delete_chat_messages_subscription",
+    "create_chat_messages_subscriptions",
+    "delete_chat_messages_subscriptions",
     "get_notifications",
     "get_lifecycle_notifications",
 ]
@@ -5,7 +5,7 @@ from http import HTTPStatus
 from aiohttp.web import Request, Response
 
 from api.decorators import ensure_qs
-from utils.graph import Graph
+from utils.graph import Graph, get_graph
 
 
 @ensure_qs("chat_id")
@@ -14,6 +14,6 @@ async def add_bot(req: Request) -> Response:
     chat_id = req.query.get("chat_id")
     print(f"\nAPI: Add bot in chat ID: {chat_id}")
 
-    graph: Graph = Graph()
+    graph: Graph = get_graph()
     await graph.add_bot_to_chat(chat_id)
     return Response(status=HTTPStatus.OK)
@@ -1,11 +1,11 @@
-"""API handler to print out some information about a chat."""
+"""API handler to get some information about a chat."""
 
 from http import HTTPStatus
 
-from aiohttp.web import Request, Response
+from aiohttp.web import Request, Response, json_response
 
 from api.decorators import ensure_qs
-from utils.graph import Graph
+from utils.graph import Graph, get_graph
 
 
 @ensure_qs("chat_id")
@@ -13,9 +13,6 @@ async def chat_info(req: Request) -> Response:
     chat_id = req.query.get("chat_id")
     print(f"Info for chat ID: {chat_id}")
 
-    graph: Graph = Graph()
-    await graph.display_chat_permissions(chat_id)
-    await graph.list_chat_members(chat_id)
-    await graph.list_chat_bots(chat_id)
-    await graph.list_chat_messages(chat_id)
-    return Response(status=HTTPStatus.OK)
+    graph: Graph = get_graph()
+    info = await graph.get_chat_info(chat_id)
+    return json_response(info, status=HTTPStatus.OK)
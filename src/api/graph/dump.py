@@ -5,10 +5,10 @@ from http import HTTPStatus
 from aiohttp.web import Request, Response
 
 from api.decorators import ensure_qs
-from utils.graph import Graph
+from utils.graph import Graph, get_graph
 
 
 async def dump_token(req: Request) -> Response:
-    graph: Graph = Graph()
+    graph: Graph = get_graph()
     await graph.display_access_token()
     return Response(status=HTTPStatus.ACCEPTED)
@@ -0,0 +1,93 @@
+"""API endpoint to export all the messages of a chat as NDJSON."""
+
+import asyncio
+import json
+import os
+import weakref
+from datetime import datetime, timezone
+
+from aiohttp.web import Request, StreamResponse
+
+from api.decorators import ensure_qs
+from config import DefaultConfig
+from utils.graph import Graph, get_graph
+
+CONFIG = DefaultConfig()
+
+# Serializes the read-modify-write of the checkpoints file
+_CHECKPOINTS_LOCK = asyncio.Lock()
+# One delta export of a chat at a time, so both don't start from the same checkpoint
+_CHAT_LOCKS: weakref.WeakValueDictionary[str, asyncio.Lock] = (
+    weakref.WeakValueDictionary()
+)
+
+
+def _load_checkpoints() -> dict:
+    try:
+        with open(CONFIG.MESSAGE_EXPORT_CHECKPOINTS, "r") as checkpoints_file:
+            return json.load(checkpoints_file)
+    except FileNotFoundError:
+        return {}
+
+
+def _save_checkpoint(chat_id: str, checkpoint: str) -> None:
+    checkpoints = _load_checkpoints()
+    checkpoints[chat_id] = checkpoint
+    path = CONFIG.MESSAGE_EXPORT_CHECKPOINTS
+    with open(path + ".tmp", "w") as checkpoints_file:
+        json.dump(checkpoints, checkpoints_file)
+    os.replace(path + ".tmp", path)
+
+
+async def _get_checkpoint(chat_id: str) -> str | None:
+    async with _CHECKPOINTS_LOCK:
+        checkpoints = await asyncio.to_thread(_load_checkpoints)
+    return checkpoints.get(chat_id)
+
+
+def _chat_lock(chat_id: str) -> asyncio.Lock:
+    lock = _CHAT_LOCKS.get(chat_id)
+    if lock is None:
+        lock = _CHAT_LOCKS[chat_id] = asyncio.Lock()
+    return lock
+
+
+@ensure_qs("chat_id")
+async def export_chat_messages(req: Request) -> StreamResponse:
+    """
+    Stream every message of a chat, one JSON document per line.
+
+    With `delta=true` only the messages modified since the previous delta export of
+    the chat are returned.
+    """
+    chat_id = req.query.get("chat_id")
+    delta = req.query.get("delta", "").lower() == "true"
+    if not delta:
+        return await _export(req, chat_id, None, delta=False)
+    async with _chat_lock(chat_id):
+        since = await _get_checkpoint(chat_id)
+        return await _export(req, chat_id, since, delta=True)
+
+
+async def _export(
+    req: Request, chat_id: str, since: str | None, delta: bool
+) -> StreamResponse:
+    print(f"\nAPI: Exporting messages of chat {chat_id} since {since}")
+
+    response = StreamResponse(headers={"Content-Type": "application/x-ndjson"})
+    await response.prepare(req)
+
+    graph: Graph = get_graph()
+    started_at = datetime.now(tz=timezone.utc).isoformat().replace("+00:00", "Z")
+    count = 0
+    async for message in graph.iter_chat_messages(chat_id, since=since):
+        await response.write(json.dumps(message).encode("utf-8") + b"\n")
+        count += 1
+
+    # Only move the checkpoint once the whole export has been written
+    if delta:
+        async with _CHECKPOINTS_LOCK:
+            await asyncio.to_thread(_save_checkpoint, chat_id, started_at)
+    print(f"\nAPI: Exported {count} messages of chat {chat_id}")
+    await response.write_eof()
+    return response
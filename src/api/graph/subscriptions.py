@@ -2,23 +2,101 @@
 API endpoints to handle Microsoft Graph webhook subscriptions for chat messages.
 """
 
+import asyncio
 import functools
 import html
+import re
 import urllib
 from http import HTTPStatus
 
-from aiohttp.web import Request, Response
-from kiota_serialization_json.json_parse_node_factory import JsonParseNodeFactory
+from aiohttp.web import HTTPBadRequest, Request, Response, json_response
 from msgraph.generated.models.message import Message
 
 from api.decorators import ensure_qs
 from config import DefaultConfig
-from utils import tokens
-from utils.crypto import _calculate_signature, _decrypt_data, _decrypt_symmetric_key
-from utils.graph import Graph
+from utils import stats, tokens
+from utils.cache import TtlLruCache
+from utils.crypto import (
+    UnknownKeyError,
+    _calculate_signature,
+    _decrypt_data,
+    _decrypt_symmetric_key,
+)
+from utils.graph import get_graph, parse_message
+from utils.pool import WorkerPool
+from utils.spool import Spool
+from utils.work_queue import WorkQueue
 
 CONFIG = DefaultConfig()
 
+# Decryption and parsing of encrypted notifications runs in this pool
+NOTIFICATION_POOL = WorkerPool(
+    CONFIG.NOTIFICATION_WORKER_MODE,
+    CONFIG.NOTIFICATION_WORKERS,
+    CONFIG.NOTIFICATION_MAX_PENDING,
+)
+stats.register("notification_pool", NOTIFICATION_POOL.stats)
+
+
+# Keys of the notifications seen recently, to drop the copies Graph delivers again
+NOTIFICATION_DEDUP = TtlLruCache(
+    max_size=CONFIG.NOTIFICATION_DEDUP_SIZE, ttl=CONFIG.NOTIFICATION_DEDUP_WINDOW
+)
+stats.register(
+    "notification_dedup",
+    lambda: {
+        "size": len(NOTIFICATION_DEDUP),
+        "duplicates": NOTIFICATION_DEDUP.hits,
+        "unique": NOTIFICATION_DEDUP.misses,
+        "duplicate_rate": NOTIFICATION_DEDUP.stats()["hit_ratio"],
+    },
+)
+
+# Notifications are written here before being queued so they survive a restart
+NOTIFICATION_SPOOL = (
+    Spool(
+        CONFIG.NOTIFICATION_SPOOL_DIR,
+        CONFIG.NOTIFICATION_SPOOL_SEGMENT_SIZE,
+        CONFIG.NOTIFICATION_SPOOL_FSYNC_INTERVAL,
+    )
+    if CONFIG.NOTIFICATION_SPOOL_DIR
+    else None
+)
+if NOTIFICATION_SPOOL:
+    stats.register("notification_spool", NOTIFICATION_SPOOL.stats)
+
+
+async def _handle_queued_notification(item):
+    seq, notification = item
+    # Only acknowledged once processed or deliberately dropped, the notifications that
+    # fail or are cancelled at shutdown are replayed on the next start
+    await _process_notification(notification)
+    if seq is not None:
+        NOTIFICATION_SPOOL.ack(seq)
+
+
+# Notifications accepted by the webhook wait here when running in "queue" mode
+NOTIFICATION_QUEUE = WorkQueue(
+    "notifications",
+    _handle_queued_notification,
+    consumers=CONFIG.NOTIFICATION_QUEUE_CONSUMERS,
+    max_size=CONFIG.NOTIFICATION_QUEUE_SIZE,
+    put_timeout=CONFIG.NOTIFICATION_QUEUE_PUT_TIMEOUT,
+)
+stats.register("notification_queue", NOTIFICATION_QUEUE.stats)
+
+
+async def replay_notification_spool():
+    """Queue the spooled notifications that weren't processed before the last shutdown."""
+    if not NOTIFICATION_SPOOL:
+        return
+    count = 0
+    async for seq, notification in NOTIFICATION_SPOOL.replay():
+        await NOTIFICATION_QUEUE.put((seq, notification), timeout=None)
+        count += 1
+    print(f"Spool: Replayed {count} notifications")
+
+
 """
 Relevant documentation:
 
@@ -28,6 +106,13 @@ https://learn.microsoft.com/en-us/graph/change-notifications-with-resource-data
 """
 
 
+# Matches chat resources whose changes affect the cached chat metadata, e.g.
+# "chats('19:...@thread.v2')/members" or "/chats/19:...@thread.v2/installedApps"
+CHAT_METADATA_RESOURCE = re.compile(
+    r"chats(?:\('(?P<quoted>[^']+)'\)|/(?P<plain>[^/]+))/(members|installedApps|permissionGrants)"
+)
+
+
 def handle_validation_request(func):
     """Decorator to validate the token when Graph sends a validation request."""
 
@@ -62,6 +147,40 @@ def check_client_state(func):
     return wrapper
 
 
+def skip_duplicates(func):
+    """
+    Decorator to drop notifications that were already processed recently.
+
+    The key is held while the notification is processed, so concurrent copies are
+    dropped too, and released if the handler fails or returns False so that a
+    redelivery by Graph is processed again.
+    """
+
+    @functools.wraps(func)
+    async def wrapper(notification, *args, **kwargs):
+        resource_data = notification.get("resourceData") or {}
+        resource_id = resource_data.get("id") or notification.get("resource")
+        key = (
+            notification.get("subscriptionId"),
+            resource_id,
+            notification.get("changeType"),
+        )
+        if NOTIFICATION_DEDUP.get(key):
+            print(f"\nWebhook: Dropping duplicate notification: {key}")
+            return
+        NOTIFICATION_DEDUP.set(key, True)
+        processed = False
+        try:
+            result = await func(notification, *args, **kwargs)
+            processed = result is not False
+            return result
+        finally:
+            if not processed:
+                NOTIFICATION_DEDUP.pop(key)
+
+    return wrapper
+
+
 def check_validation_tokens(func):
     """Decorator to validate the notification's validation tokens."""
 
@@ -69,11 +188,10 @@ def check_validation_tokens(func):
     async def wrapper(request, *args, **kwargs):
         body = await request.json()
         if body.get("validationTokens"):
-            graph = Graph()
             for token in body["validationTokens"]:
                 # print(f"Validation token: {token}")
                 try:
-                    valid = tokens.validate_token(token)
+                    valid = await tokens.validate_token_async(token)
                     if not valid:
                         return Response(
                             status=HTTPStatus.UNAUTHORIZED,
@@ -95,7 +213,7 @@ async def create_chat_messages_subscription(req: Request) -> Response:
     """Create a subscription to receive updates when a chat has new messages."""
     chat_id = req.query.get("chat_id")
     print(f"\nAPI: Creating subscription for chat: {chat_id}")
-    graph = Graph()
+    graph = get_graph()
     await graph.create_chat_messages_subscription(chat_id)
     return Response(
         status=HTTPStatus.OK,
@@ -109,7 +227,7 @@ async def delete_chat_messages_subscription(req: Request) -> Response:
     """Delete a subscription to a chat's messages."""
     chat_id = req.query.get("chat_id")
     print(f"\nAPI: Deleting subscription for chat: {chat_id}")
-    graph = Graph()
+    graph = get_graph()
     ret = await graph.delete_chat_messages_subscription(chat_id)
     if ret:
         print(f"\nAPI: Deleted subscription for chat: {chat_id}")
@@ -127,11 +245,51 @@ async def delete_chat_messages_subscription(req: Request) -> Response:
         )
 
 
+async def _read_chat_ids(req: Request) -> list[str]:
+    """
+    Read the chat ids from a JSON body ({"chat_ids": [...]} or a list) or from a
+    stream with one chat id per line.
+    """
+    if req.content_type == "application/json":
+        try:
+            body = await req.json()
+        except ValueError:
+            raise HTTPBadRequest(text="API: Invalid JSON body")
+        chat_ids = body.get("chat_ids") if isinstance(body, dict) else body
+        if not isinstance(chat_ids, list) or not all(
+            isinstance(chat_id, str) and chat_id for chat_id in chat_ids
+        ):
+            raise HTTPBadRequest(text="API: 'chat_ids' must be a list of chat ids")
+        return chat_ids
+    chat_ids = []
+    async for line in req.content:
+        chat_id = line.decode("utf-8").strip()
+        if chat_id:
+            chat_ids.append(chat_id)
+    return chat_ids
+
+
+async def create_chat_messages_subscriptions(req: Request) -> Response:
+    """Create subscriptions for the messages of many chats."""
+    chat_ids = await _read_chat_ids(req)
+    print(f"\nAPI: Creating subscriptions for {len(chat_ids)} chats")
+    results = await get_graph().create_chat_messages_subscriptions(chat_ids)
+    return json_response(results)
+
+
+async def delete_chat_messages_subscriptions(req: Request) -> Response:
+    """Delete the message subscriptions of many chats."""
+    chat_ids = await _read_chat_ids(req)
+    print(f"\nAPI: Deleting subscriptions for {len(chat_ids)} chats")
+    results = await get_graph().delete_chat_messages_subscriptions(chat_ids)
+    return json_response(results)
+
+
 @ensure_qs("chat_id")
 async def list_chat_messages_subscription(req: Request) -> Response:
     """List all subscriptions (at most one IRL)."""
     chat_id = req.query.get("chat_id")
-    graph = Graph()
+    graph = get_graph()
     subscription = await graph.list_chat_messages_subscription(chat_id)
     if subscription:
         return Response(
@@ -157,9 +315,38 @@ async def get_notifications(req: Request) -> Response:
             status=HTTPStatus.BAD_REQUEST, text="No notification data provided"
         )
     # Process the notification data
-    if "value" in body:
-        for notification in body["value"]:
-            await _process_notification(notification)
+    if "value" in body and NOTIFICATION_QUEUE.running:
+        notifications = body["value"]
+        if NOTIFICATION_SPOOL:
+            # Appended together so the whole batch shares one fsync
+            seqs = await asyncio.gather(
+                *(NOTIFICATION_SPOOL.append(n) for n in notifications)
+            )
+        else:
+            seqs = [None] * len(notifications)
+        for i, (seq, notification) in enumerate(zip(seqs, notifications)):
+            if not await NOTIFICATION_QUEUE.put((seq, notification)):
+                print("\nWebhook: Notification queue is full")
+                # Graph will deliver the rest again
+                for rejected_seq in seqs[i:]:
+                    if rejected_seq is not None:
+                        NOTIFICATION_SPOOL.ack(rejected_seq)
+                return Response(
+                    status=HTTPStatus.SERVICE_UNAVAILABLE,
+                    headers={"Retry-After": "10"},
+                    text="Notification queue is full",
+                )
+        return Response(status=HTTPStatus.ACCEPTED)
+    elif "value" in body:
+        results = await asyncio.gather(
+            *(_process_notification(n) for n in body["value"]),
+            return_exceptions=True,
+        )
+        for notification, result in zip(body["value"], results):
+            if isinstance(result, Exception):
+                print(
+                    f"\nWebhook: Error processing notification {notification.get('id')}: {result}"
+                )
     else:
         # If the body does not contain 'value', log the entire body
         # This is useful for debugging unexpected notification formats
@@ -169,12 +356,17 @@ async def get_notifications(req: Request) -> Response:
 
 
 @check_client_state
-async def _process_notification(notification):
-    """Process a single Graph notification."""
+@skip_duplicates
+async def _process_notification(notification) -> bool:
+    """Process a single Graph notification. Return False if it was rejected."""
     # Here you can add logic to handle the notification
     # For example, you might want to queue it for processing
     # print(f"\nWebhook: Processing notification: {notification}")
-    data = notification["resourceData"]
+    match = CHAT_METADATA_RESOURCE.search(notification.get("resource", ""))
+    if match:
+        get_graph().invalidate_chat(match.group("quoted") or match.group("plain"))
+
+    data = notification.get("resourceData") or {}
     if (
         notification["changeType"] == "created"
         and data.get("@odata.type") == "#Microsoft.Graph.chatMessage"
@@ -185,28 +377,33 @@ async def _process_notification(notification):
         print(f"\nWebhook: Received Graph notification: {notification}")
 
     if notification["encryptedContent"]:
-        # TODO Probably want to extract this to a separate function
-        encrypted_content = notification["encryptedContent"]
-        dataKey = encrypted_content.get("dataKey")
-        data = encrypted_content.get("data")
-        dataSignature = encrypted_content.get("dataSignature")
-        # Decrypt the content using the symmetric key
-        symmetric_key = _decrypt_symmetric_key(dataKey)
-        # print(f"\nWebhook: key: {symmetric_key}")
-        signature = _calculate_signature(symmetric_key, data)
-        # print(f"\nWebhook: signature: {signature}")
-        if signature != dataSignature:
+        try:
+            message = await NOTIFICATION_POOL.run(
+                _decrypt_notification, notification["encryptedContent"]
+            )
+        except UnknownKeyError as e:
+            print(f"\nWebhook: Dropping notification {notification['id']}: {e.args[0]}")
+            return False
+        if message is None:
             print(f"\nWebhook: Signature mismatch: {notification['id']}")
-            return
-        decrypted_data = _decrypt_data(symmetric_key, data)
-        # print(f"\nWebhook: Decrypted data: {decrypted_data}")
-
-        # TODO Extract this to a separate function in the Graph module?
-        node = JsonParseNodeFactory().get_root_parse_node(
-            content_type="application/json", content=decrypted_data.encode("utf-8")
-        )
-        message = node.get_object_value(Message)
+            return False
         print(f"\nWebhook: Message body: {message.body.content}")
+    return True
+
+
+def _decrypt_notification(encrypted_content: dict) -> Message | None:
+    """Decrypt and parse the content of a notification. Runs in the worker pool."""
+    dataKey = encrypted_content.get("dataKey")
+    data = encrypted_content.get("data")
+    dataSignature = encrypted_content.get("dataSignature")
+    key_id = encrypted_content.get("encryptionCertificateId")
+    # Decrypt the content using the symmetric key
+    symmetric_key = _decrypt_symmetric_key(dataKey, key_id)
+    signature = _calculate_signature(symmetric_key, data)
+    if signature != dataSignature:
+        return None
+    decrypted_data = _decrypt_data(symmetric_key, data)
+    return parse_message(decrypted_data)
 
 
 @handle_validation_request
@@ -243,7 +440,10 @@ async def _process_lifecycle_notification(notification):
         print(
             f"Reauthorization required for notification: {notification['subscriptionId']}"
         )
-        graph = Graph()
+        graph = get_graph()
         await graph.subscription_reauthorize(notification["subscriptionId"])
+    elif notification["lifecycleEvent"] == "subscriptionRemoved":
+        print(f"Subscription removed: {notification['subscriptionId']}")
+        get_graph().subscriptions.remove(notification["subscriptionId"])
     else:
         print(f"\nLF Webhook: Received Graph lifecycle notification: {notification}")
@@ -0,0 +1,16 @@
+"""API endpoint to follow the progress of background jobs (broadcasts, bulk sends)."""
+
+from http import HTTPStatus
+
+from aiohttp.web import Request, Response, json_response
+
+from api.decorators import ensure_qs
+from utils.jobs import JOBS
+
+
+@ensure_qs("id")
+async def get_job(req: Request) -> Response:
+    job = JOBS.get(req.query.get("id"))
+    if job is None:
+        return Response(status=HTTPStatus.NOT_FOUND, text="API: Job not found")
+    return json_response(job.to_dict())
@@ -0,0 +1,9 @@
+"""API endpoint to dump the runtime counters (cache hit ratios, queue depths, etc.)."""
+
+from aiohttp.web import Request, Response, json_response
+
+from utils import stats
+
+
+async def get_stats(req: Request) -> Response:
+    return json_response(stats.collect())
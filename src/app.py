@@ -1,19 +1,89 @@
+import asyncio
+import logging
+
 from aiohttp import web
 from botbuilder.core.integration import aiohttp_error_middleware
 
 from api.graph import *
-from bots.adapter import messages, send_proactive
+from api.graph.subscriptions import (
+    NOTIFICATION_POOL,
+    NOTIFICATION_QUEUE,
+    NOTIFICATION_SPOOL,
+    replay_notification_spool,
+)
+from api.jobs import get_job
+from api.stats import get_stats
+from bots.adapter import messages, send_proactive, send_proactive_bulk
+from bots.auth import BOT_SIGNING_KEYS
 from config import DefaultConfig
+from utils import stats
+from utils.card_templates import CARD_TEMPLATES
+from utils.conversation_store import CONVERSATIONS
+from utils.crypto import NOTIFICATION_KEYS
+from utils.graph import close_graph, get_graph
+from utils.token_manager import TOKENS
+from utils.tokens import GRAPH_JWKS
 
 CONFIG = DefaultConfig()
+logging.basicConfig(level=CONFIG.LOG_LEVEL)
+
+
+async def on_startup(app: web.Application):
+    # Parse the notification keys before the first notification arrives
+    NOTIFICATION_KEYS.reload()
+    NOTIFICATION_KEYS.start()
+    CARD_TEMPLATES.load()
+    graph = get_graph()
+    stats.register("subscriptions", graph.subscriptions.stats)
+    stats.register("subscription_renewals", graph.renewals.stats)
+    stats.register("graph_batch", graph.batcher.stats)
+    stats.register("chat_metadata", graph.chat_metadata.stats)
+    if CONFIG.APP_ID:
+        TOKENS.start()
+        BOT_SIGNING_KEYS.start()
+        # Download the keys of the validation tokens before the first notification
+        GRAPH_JWKS.start(CONFIG.JWKS_REFRESH_INTERVAL)
+        app["subscriptions_sync"] = asyncio.create_task(graph.sync_subscriptions())
+        graph.renewals.start()
+    NOTIFICATION_POOL.start()
+    if CONFIG.NOTIFICATION_INGESTION_MODE == "queue":
+        NOTIFICATION_QUEUE.start()
+        app["spool_replay"] = asyncio.create_task(replay_notification_spool())
+
+
+async def on_shutdown(app: web.Application):
+    if "spool_replay" in app:
+        app["spool_replay"].cancel()
+    # Finish the notifications that were already accepted
+    await NOTIFICATION_QUEUE.stop(CONFIG.NOTIFICATION_QUEUE_DRAIN_TIMEOUT)
+    if NOTIFICATION_SPOOL:
+        await NOTIFICATION_SPOOL.close()
+    await CONVERSATIONS.close()
+
+
+async def on_cleanup(app: web.Application):
+    NOTIFICATION_POOL.shutdown()
+    await NOTIFICATION_KEYS.stop()
+    await close_graph()
+    await TOKENS.stop()
+    await BOT_SIGNING_KEYS.stop()
+    await GRAPH_JWKS.stop()
+
 
 APP = web.Application(middlewares=[aiohttp_error_middleware])
+APP.on_startup.append(on_startup)
+APP.on_shutdown.append(on_shutdown)
+APP.on_cleanup.append(on_cleanup)
 APP.router.add_post("/api/messages", messages)
 APP.router.add_get("/api/proactive", send_proactive)
+APP.router.add_post("/api/proactive/bulk", send_proactive_bulk)
+APP.router.add_get("/api/jobs", get_job)
 
 APP.router.add_get("/api/dump_token", dump_token)
+APP.router.add_get("/api/stats", get_stats)
 
 APP.router.add_get("/api/chat_info", chat_info)
+APP.router.add_get("/api/chat_messages/export", export_chat_messages)
 
 APP.router.add_get("/api/bots/add", add_bot)
 
@@ -23,6 +93,10 @@ APP.router.add_post("/api/subs/lf", get_lifecycle_notifications)
 APP.router.add_get("/api/subs/messages", list_chat_messages_subscription)
 APP.router.add_get("/api/subs/messages/new", create_chat_messages_subscription)
 APP.router.add_get("/api/subs/messages/delete", delete_chat_messages_subscription)
+APP.router.add_post("/api/subs/messages/bulk/new", create_chat_messages_subscriptions)
+APP.router.add_post(
+    "/api/subs/messages/bulk/delete", delete_chat_messages_subscriptions
+)
 
 if __name__ == "__main__":
     try:
@@ -0,0 +1,197 @@
+"""
+Fast deserialization of the activities received in /api/messages.
+
+msrest's generic Deserializer walks key extractors and type metadata for every field of
+every activity. Here the attribute map of every schema model is compiled once into a
+table of JSON key -> (attribute, converter), which builds the same objects, including
+unknown keys in `additional_properties`, in a fraction of the time. Fields that are
+rarely used by the bot are kept as raw JSON and only converted when first read.
+Anything the compiled path doesn't know how to convert is handed to msrest.
+"""
+
+import json
+from datetime import datetime
+from typing import Any, Callable
+
+from botbuilder import schema
+from botbuilder.schema import Activity
+from msrest.serialization import Deserializer, Model
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+MODELS = {k: v for k, v in vars(schema).items() if isinstance(v, type)}
+_DESERIALIZER = Deserializer(MODELS)
+
+# Activity fields converted on first access
+LAZY_FIELDS = (
+    "attachments",
+    "suggested_actions",
+    "reactions_added",
+    "reactions_removed",
+    "relates_to",
+    "text_highlights",
+    "semantic_action",
+)
+
+Converter = Callable[[Any], Any]
+
+_CONVERTERS: dict[str, Converter] = {}
+_BASIC_TYPES = {"str": str, "bool": bool, "int": int, "float": (int, float)}
+
+
+def loads(data: bytes) -> Any:
+    """Decode a JSON document, with orjson when it's installed."""
+    if orjson:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def parse_activity(body: dict) -> Activity:
+    """Build an Activity from its JSON body, like Activity().deserialize(body)."""
+    return _converter("LazyActivity")(body)
+
+
+def _fallback(data_type: str) -> Converter:
+    return lambda value: _DESERIALIZER.deserialize_data(value, data_type)
+
+
+def _converter(data_type: str) -> Converter:
+    converter = _CONVERTERS.get(data_type)
+    if converter is None:
+        converter = _CONVERTERS[data_type] = _compile(data_type)
+    return converter
+
+
+def _compile(data_type: str) -> Converter:
+    if data_type == "object":
+        return lambda value: value
+
+    if data_type in _BASIC_TYPES:
+        expected = _BASIC_TYPES[data_type]
+        fallback = _fallback(data_type)
+        return lambda value: value if isinstance(value, expected) else fallback(value)
+
+    if data_type == "iso-8601":
+        fallback = _fallback(data_type)
+
+        def parse_datetime(value):
+            try:
+                return datetime.fromisoformat(value)
+            except (TypeError, ValueError):
+                return fallback(value)
+
+        return parse_datetime
+
+    if data_type.startswith("[") and data_type.endswith("]"):
+        # Resolved on first use, the item type may be the model being compiled
+        item_type = data_type[1:-1]
+        fallback = _fallback(data_type)
+
+        def convert_list(value):
+            if not isinstance(value, list):
+                return fallback(value)
+            convert = _converter(item_type)
+            return [None if item is None else convert(item) for item in value]
+
+        return convert_list
+
+    if data_type.startswith("{") and data_type.endswith("}"):
+        item_type = data_type[1:-1]
+        fallback = _fallback(data_type)
+
+        def convert_dict(value):
+            if not isinstance(value, dict):
+                return fallback(value)
+            convert = _converter(item_type)
+            return {k: None if v is None else convert(v) for k, v in value.items()}
+
+        return convert_dict
+
+    model = LazyActivity if data_type == "LazyActivity" else MODELS.get(data_type)
+    if (
+        isinstance(model, type)
+        and issubclass(model, Model)
+        and not getattr(model, "_subtype_map", None)
+        and not any("." in d["key"] for d in model._attribute_map.values())
+    ):
+        return _compile_model(model)
+
+    # Enums, polymorphic and flattened models
+    return _fallback(data_type)
+
+
+def _compile_model(model: type) -> Converter:
+    lazy = getattr(model, "_lazy_fields", ())
+    fields = {
+        desc["key"]: (attr, desc["type"])
+        for attr, desc in model._attribute_map.items()
+        if desc["key"]
+    }
+    defaults = {k: v for k, v in vars(model()).items() if k not in lazy}
+    defaults.pop("additional_properties", None)
+    fallback = _fallback(model.__name__)
+    table: dict[str, tuple[str, Converter | None]] = {}
+
+    def build(data):
+        if not isinstance(data, dict):
+            return fallback(data)
+        if not table:
+            for key, (attr, data_type) in fields.items():
+                table[key] = (attr, None if attr in lazy else _converter(data_type))
+        obj = model.__new__(model)
+        attributes = obj.__dict__
+        attributes.update(defaults)
+        additional_properties = {}
+        raw = {}
+        for key, value in data.items():
+            field = table.get(key)
+            if field is None:
+                additional_properties[key] = value
+                continue
+            attr, convert = field
+            if convert is None:
+                raw[attr] = value
+            else:
+                attributes[attr] = None if value is None else convert(value)
+        attributes["additional_properties"] = additional_properties
+        if lazy:
+            attributes["_raw"] = raw
+        return obj
+
+    return build
+
+
+class _LazyField:
+    """An attribute converted from the raw JSON the first time it is read."""
+
+    def __init__(self, attr: str):
+        self._attr = attr
+        self._data_type = Activity._attribute_map[attr]["type"]
+
+    def __get__(self, obj, objtype=None):
+        if obj is None:
+            return self
+        attributes = obj.__dict__
+        if self._attr not in attributes:
+            value = attributes.get("_raw", {}).pop(self._attr, None)
+            attributes[self._attr] = (
+                None if value is None else _converter(self._data_type)(value)
+            )
+        return attributes[self._attr]
+
+    def __set__(self, obj, value):
+        obj.__dict__.get("_raw", {}).pop(self._attr, None)
+        obj.__dict__[self._attr] = value
+
+
+class LazyActivity(Activity):
+    """An Activity where the rarely used fields are converted on first access."""
+
+    _lazy_fields = LAZY_FIELDS
+
+
+for _attr in LAZY_FIELDS:
+    setattr(LazyActivity, _attr, _LazyField(_attr))
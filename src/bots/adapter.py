@@ -1,3 +1,4 @@
+import logging
 import sys
 import traceback
 import uuid
@@ -5,28 +6,35 @@ from datetime import datetime
 from http import HTTPStatus
 
 from aiohttp.web import Request, Response, json_response
-from botbuilder.core import (
-    BotFrameworkAdapter,
-    BotFrameworkAdapterSettings,
-    TurnContext,
-)
-from botbuilder.schema import (
-    Activity,
-    ActivityTypes,
-    ConversationReference,
-    ConversationAccount,
-)
+from botbuilder.core import BotFrameworkAdapterSettings, TurnContext
+from botbuilder.schema import Activity, ActivityTypes
 
 from config import DefaultConfig
+from utils import stats
+from utils.token_manager import BOT_TOKEN, ManagedAppCredentials
 
 from . import TeamsConversationBot
+from .activity import loads, parse_activity
+from .auth import CachingBotFrameworkAdapter
+from .proactive import BulkSend, chat_reference
+from .scheduler import TurnScheduler
 
 CONFIG = DefaultConfig()
+LOGGER = logging.getLogger(__name__)
 
 # Create adapter.
 # See https://aka.ms/about-bot-adapter to learn more about how bots work.
-SETTINGS = BotFrameworkAdapterSettings(CONFIG.APP_ID, CONFIG.APP_PASSWORD)
-ADAPTER = BotFrameworkAdapter(SETTINGS)
+SETTINGS = BotFrameworkAdapterSettings(
+    CONFIG.APP_ID,
+    CONFIG.APP_PASSWORD,
+    app_credentials=(
+        ManagedAppCredentials(BOT_TOKEN, CONFIG.APP_ID, CONFIG.APP_PASSWORD)
+        if CONFIG.APP_ID
+        else None
+    ),
+)
+ADAPTER = CachingBotFrameworkAdapter(SETTINGS)
+stats.register("bot_auth", ADAPTER.identities.stats)
 
 
 # Catch-all for errors.
@@ -67,20 +75,31 @@ APP_ID = SETTINGS.app_id if SETTINGS.app_id else uuid.uuid4()
 # Create the Bot
 BOT = TeamsConversationBot(CONFIG.APP_ID, CONFIG.APP_PASSWORD)
 
+# Runs the turns of each conversation in order, with a global concurrency limit
+TURNS = TurnScheduler()
+stats.register("turns", TURNS.stats)
+
 
 # Listen for incoming requests on /api/messages.
 async def messages(req: Request) -> Response:
     # Main bot message handler.
     if "application/json" in req.headers["Content-Type"]:
-        body = await req.json()
+        raw_body = await req.read()
     else:
         return Response(status=HTTPStatus.UNSUPPORTED_MEDIA_TYPE)
 
-    print(f"\nAPI: Received activity: {body}")
-    activity = Activity().deserialize(body)
+    # Only format the body when debug logging is on
+    if LOGGER.isEnabledFor(logging.DEBUG):
+        LOGGER.debug("API: Received activity: %s", raw_body.decode("utf-8"))
+    activity = parse_activity(loads(raw_body))
     auth_header = req.headers["Authorization"] if "Authorization" in req.headers else ""
 
-    response = await ADAPTER.process_activity(activity, auth_header, BOT.on_turn)
+    conversation_id = activity.conversation.id if activity.conversation else ""
+
+    async def on_turn(turn_context: TurnContext):
+        return await TURNS.run(conversation_id, lambda: BOT.on_turn(turn_context))
+
+    response = await ADAPTER.process_activity(activity, auth_header, on_turn)
     if response:
         return json_response(data=response.body, status=response.status)
     return Response(status=HTTPStatus.OK)
@@ -96,25 +115,51 @@ async def send_proactive(req: Request) -> Response:
 
     print(f"\nAPI: Sending proactive message to chat ID: {chat_id}")
 
-    conv_reference = ConversationReference(
-        conversation=ConversationAccount(
-            id=chat_id,
-            is_group=True,
-            conversation_type="groupChat",
-            tenant_id=CONFIG.TENANT_ID,
-        ),
-        channel_id="msteams",
-        service_url=CONFIG.SERVICE_URL,
-    )
-
     async def send_text(turn_context: TurnContext):
         return await turn_context.send_activity(f"This is a proactive message")
 
     # Send the activity
     await ADAPTER.continue_conversation(
-        reference=conv_reference,
+        reference=chat_reference(chat_id),
         callback=send_text,
         bot_id=APP_ID,
     )
 
     return Response(status=HTTPStatus.OK)
+
+
+async def send_proactive_bulk(req: Request) -> Response:
+    """
+    Send a message to many chats in the background and return the job id.
+
+    The body is {"chat_ids": [...], "text": "..."} or {"chat_ids": [...], "card": {...}}
+    with the adaptive card content.
+    """
+    try:
+        body = await req.json()
+    except ValueError:
+        return Response(status=HTTPStatus.BAD_REQUEST, text="API: Invalid JSON body")
+    if not isinstance(body, dict):
+        return Response(
+            status=HTTPStatus.BAD_REQUEST, text="API: The body must be a JSON object"
+        )
+    chat_ids = body.get("chat_ids")
+    if (
+        not isinstance(chat_ids, list)
+        or not chat_ids
+        or not all(isinstance(chat_id, str) and chat_id for chat_id in chat_ids)
+    ):
+        return Response(
+            status=HTTPStatus.BAD_REQUEST,
+            text="API: 'chat_ids' must be a non-empty list of chat ids",
+        )
+    text, card = body.get("text"), body.get("card")
+    if not (isinstance(text, str) and text or isinstance(card, dict) and card):
+        return Response(
+            status=HTTPStatus.BAD_REQUEST,
+            text="API: A 'text' string or a 'card' object is required",
+        )
+
+    print(f"\nAPI: Sending proactive message to {len(chat_ids)} chats")
+    job = BulkSend(ADAPTER, APP_ID, chat_ids, text=text, card=card).start()
+    return json_response(job.to_dict(), status=HTTPStatus.ACCEPTED)
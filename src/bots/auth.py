@@ -0,0 +1,107 @@
+"""
+Authentication of the activities received from the Bot Framework channel.
+
+The bearer tokens that pass validation are remembered (by digest) until they expire, so
+repeated requests with the same token skip the RS256 verification. The signing keys of
+the channel are downloaded at startup and refreshed in the background, and the
+botbuilder token extractor is pointed at them instead of its own metadata cache.
+"""
+
+import asyncio
+import hashlib
+
+from botbuilder.core import BotFrameworkAdapter
+from botbuilder.schema import Activity
+from botframework.connector.auth import AuthenticationConstants, ClaimsIdentity
+from botframework.connector.auth.jwt_token_extractor import JwtTokenExtractor
+
+from config import DefaultConfig
+from utils import stats
+from utils.cache import TtlLruCache
+from utils.jwks import JwksCache, openid_key_source
+
+CONFIG = DefaultConfig()
+
+
+class SigningKey:
+    """A signing key in the shape the botbuilder token extractor expects."""
+
+    def __init__(self, public_key, endorsements: list[str]):
+        self.public_key = public_key
+        self.endorsements = endorsements
+
+
+class OpenIdSigningKeys:
+    """The signing keys of an OpenID metadata endpoint, refreshed in the background."""
+
+    def __init__(
+        self,
+        metadata_url: str,
+        refresh_interval: float = CONFIG.BOT_SIGNING_KEYS_REFRESH_INTERVAL,
+    ):
+        self.metadata_url = metadata_url
+        self._refresh_interval = refresh_interval
+        self._source = openid_key_source(metadata_url)
+        self._jwks = JwksCache(self._fetch)
+        self._endorsements: dict[str, list[str]] = {}
+
+    async def get(self, key_id: str) -> SigningKey:
+        # Downloads only happen here if the background refresh fell behind
+        key = await asyncio.to_thread(self._jwks.get_signing_key, key_id)
+        return SigningKey(key.key, self._endorsements.get(key_id, []))
+
+    def start(self) -> None:
+        self._jwks.start(self._refresh_interval)
+
+    async def stop(self) -> None:
+        await self._jwks.stop()
+
+    def _fetch(self) -> dict:
+        document = self._source()
+        self._endorsements = {
+            key["kid"]: key.get("endorsements", [])
+            for key in document.get("keys", [])
+            if "kid" in key
+        }
+        return document
+
+    def stats(self) -> dict:
+        return self._jwks.stats()
+
+
+class CachingBotFrameworkAdapter(BotFrameworkAdapter):
+    """A BotFrameworkAdapter that remembers the identities of validated tokens."""
+
+    def __init__(self, settings, cache_size: int = CONFIG.BOT_AUTH_CACHE_SIZE):
+        super().__init__(settings)
+        self.identities = TtlLruCache(max_size=cache_size)
+
+    async def _authenticate_request(
+        self, request: Activity, auth_header: str
+    ) -> ClaimsIdentity:
+        if not auth_header:
+            return await super()._authenticate_request(request, auth_header)
+
+        # The service URL and channel are validated against the token too
+        digest = hashlib.sha256(
+            f"{auth_header}\n{request.channel_id}\n{request.service_url}".encode(
+                "utf-8"
+            )
+        ).hexdigest()
+        identity = self.identities.get(digest)
+        if identity is not None:
+            return identity
+
+        identity = await super()._authenticate_request(request, auth_header)
+        expires_at = identity.claims.get("exp") if identity.claims else None
+        if isinstance(expires_at, (int, float)):
+            self.identities.set(digest, identity, expires_at=expires_at)
+        return identity
+
+
+# Signing keys of the tokens sent by the Bot Framework channel (Teams)
+BOT_SIGNING_KEYS = OpenIdSigningKeys(
+    AuthenticationConstants.TO_BOT_FROM_CHANNEL_OPENID_METADATA_URL
+)
+JwtTokenExtractor.metadataCache[BOT_SIGNING_KEYS.metadata_url] = BOT_SIGNING_KEYS
+stats.register("bot_signing_keys", BOT_SIGNING_KEYS.stats)
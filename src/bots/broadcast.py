@@ -0,0 +1,148 @@
+"""
+Background fan-out of proactive 1:1 messages to every member of a conversation.
+
+Members are streamed page by page into a FanOut, which limits the concurrency and the
+rate of the sends and retries the throttled ones.
+"""
+
+import asyncio
+from functools import partial
+
+from botbuilder.core import BotAdapter, MessageFactory, TurnContext
+from botbuilder.core.teams import TeamsInfo
+from botbuilder.schema import ConversationParameters, ConversationReference
+from botbuilder.schema.teams import TeamsChannelAccount
+
+from config import DefaultConfig
+from utils.conversation_store import CONVERSATIONS
+from utils.fanout import FanOut
+from utils.jobs import JOBS, Job
+from utils.rate_limit import retry_after
+
+CONFIG = DefaultConfig()
+
+# Keep a reference to the running broadcasts so they aren't garbage collected
+_TASKS: set[asyncio.Task] = set()
+
+
+class Broadcast:
+    """Sends a 1:1 message to every member of the conversation of a turn."""
+
+    def __init__(
+        self,
+        adapter: BotAdapter,
+        app_id: str,
+        reference: ConversationReference,
+        team_id: str | None = None,
+        concurrency: int = CONFIG.BROADCAST_CONCURRENCY,
+        rate: float = CONFIG.BROADCAST_RATE,
+        burst: int = CONFIG.BROADCAST_BURST,
+        max_retries: int = CONFIG.BROADCAST_MAX_RETRIES,
+    ):
+        self._adapter = adapter
+        self._app_id = app_id
+        self._reference = reference
+        # The turn of continue_conversation has no channelData, so no team
+        self._team_id = team_id
+        self.job: Job = JOBS.create("broadcast")
+        self._fanout = FanOut(self.job, concurrency, rate, burst, max_retries)
+
+    def start(self) -> Job:
+        """Run the broadcast in the background and return its job."""
+        task = asyncio.create_task(self._run(), name=f"broadcast-{self.job.id}")
+        _TASKS.add(task)
+        task.add_done_callback(_TASKS.discard)
+        return self.job
+
+    async def _run(self) -> None:
+        try:
+            # A new turn so the broadcast doesn't depend on the turn that started it
+            await self._adapter.continue_conversation(
+                self._reference, self._send_to_all, self._app_id
+            )
+            self.job.finish()
+        except Exception as e:
+            print(f"\nBOT: Broadcast {self.job.id} failed: {e}")
+            self.job.finish("failed")
+
+    async def _send_to_all(self, turn_context: TurnContext) -> None:
+        continuation_token = None
+        total = 0
+
+        while True:
+            if self._team_id:
+                current_page = await TeamsInfo.get_paged_team_members(
+                    turn_context, self._team_id, continuation_token, 100
+                )
+            else:
+                current_page = await TeamsInfo.get_paged_members(
+                    turn_context, continuation_token, 100
+                )
+            for member in current_page.members:
+                # Wait for a free sender before reading more members
+                await self._fanout.submit(
+                    member.id, partial(self._send_message, turn_context, member)
+                )
+            total += len(current_page.members)
+            continuation_token = current_page.continuation_token
+            if continuation_token is None:
+                break
+
+        await self._fanout.wait()
+        self.job.total = total
+        print(
+            f"\nBOT: Broadcast {self.job.id} sent {self.job.succeeded} of {total} "
+            "messages"
+        )
+        await turn_context.send_activity(
+            MessageFactory.text(
+                f"All messages have been sent ({self.job.succeeded} sent, "
+                f"{self.job.failed} failed)"
+            )
+        )
+
+    async def _send_message(
+        self, turn_context: TurnContext, member: TeamsChannelAccount
+    ) -> None:
+        async def send_message(tc2: TurnContext):
+            return await tc2.send_activity(
+                f"Hello {member.name}. I'm a Teams conversation bot."
+            )
+
+        tenant_id = turn_context.activity.conversation.tenant_id
+        user_id = member.aad_object_id or member.id
+        reference = await CONVERSATIONS.get(tenant_id, user_id)
+        if reference:
+            try:
+                await self._adapter.continue_conversation(
+                    reference, send_message, self._app_id
+                )
+                return
+            except Exception as e:
+                if retry_after(e) is not None:
+                    raise
+                # The conversation may be gone, open a new one
+                await CONVERSATIONS.remove(tenant_id, user_id)
+
+        conversation_reference = TurnContext.get_conversation_reference(
+            turn_context.activity
+        )
+        conversation_parameters = ConversationParameters(
+            is_group=False,
+            bot=turn_context.activity.recipient,
+            members=[member],
+            tenant_id=tenant_id,
+        )
+
+        async def get_ref(tc1: TurnContext):
+            conversation_reference_inner = TurnContext.get_conversation_reference(
+                tc1.activity
+            )
+            await CONVERSATIONS.put(tenant_id, user_id, conversation_reference_inner)
+            return await tc1.adapter.continue_conversation(
+                conversation_reference_inner, send_message, self._app_id
+            )
+
+        await turn_context.adapter.create_conversation(
+            conversation_reference, get_ref, conversation_parameters
+        )
@@ -0,0 +1,129 @@
+"""
+Declarative registry of the text commands understood by the bot.
+
+Handlers register with a pattern and a match type:
+- "exact": the whole text is the pattern.
+- "prefix": the text starts with the pattern.
+- "contains": the pattern appears anywhere in the text.
+
+Exact matches win over prefix matches, which win over contains matches. Among the
+prefix or contains commands that match, the one registered first wins, so "mention me"
+must be registered before "mention". Prefix and contains patterns are each compiled
+into a single regex with one named group per command, tried in registration order.
+"""
+
+import re
+import time
+from typing import Awaitable, Callable
+
+from botbuilder.core import TurnContext
+
+MATCH_TYPES = ("exact", "prefix", "contains")
+
+# An unbound bot method: handler(bot, turn_context)
+Handler = Callable[..., Awaitable]
+
+
+class Command:
+    """A registered command and its timing counters."""
+
+    def __init__(self, pattern: str, match: str, handler: Handler):
+        self.pattern = pattern
+        self.match = match
+        self.handler = handler
+        self.calls = 0
+        self.errors = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+
+    def stats(self) -> dict:
+        return {
+            "handler": self.handler.__name__,
+            "match": self.match,
+            "calls": self.calls,
+            "errors": self.errors,
+            "avg_time": self.total_time / self.calls if self.calls else 0.0,
+            "max_time": self.max_time,
+        }
+
+
+class CommandRouter:
+    """Matches the text of a message to a command and runs its handler."""
+
+    def __init__(self):
+        self._commands: dict[str, dict[str, Command]] = {m: {} for m in MATCH_TYPES}
+        self._regexes: dict[str, re.Pattern | None] | None = None
+        self._ordered: dict[str, list[Command]] = {}
+        self._default: Command | None = None
+
+    def command(self, pattern: str, match: str = "contains"):
+        """Decorator to register a handler for a command."""
+        if match not in MATCH_TYPES:
+            raise ValueError(f"Unknown match type: {match}")
+
+        def decorator(handler: Handler) -> Handler:
+            self._commands[match][pattern.lower()] = Command(
+                pattern.lower(), match, handler
+            )
+            # Compile the matchers again on the next dispatch
+            self._regexes = None
+            return handler
+
+        return decorator
+
+    def default(self, handler: Handler) -> Handler:
+        """Decorator to register the handler for the text that matches no command."""
+        self._default = Command("", "default", handler)
+        return handler
+
+    def match(self, text: str) -> Command | None:
+        command = self._commands["exact"].get(text)
+        if command:
+            return command
+        if self._regexes is None:
+            self._compile()
+        for match in ("prefix", "contains"):
+            regex = self._regexes[match]
+            found = regex and regex.match(text)
+            if found:
+                # Groups are named after the position of the command
+                return self._ordered[match][int(found.lastgroup[1:])]
+        return self._default
+
+    async def dispatch(self, bot, turn_context: TurnContext, text: str) -> bool:
+        """Run the handler of the command in the text. Return False if none matched."""
+        command = self.match(text)
+        if command is None:
+            return False
+        start = time.perf_counter()
+        try:
+            await command.handler(bot, turn_context)
+        except Exception:
+            command.errors += 1
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            command.calls += 1
+            command.total_time += elapsed
+            command.max_time = max(command.max_time, elapsed)
+        return True
+
+    def stats(self) -> dict:
+        commands = [c for m in MATCH_TYPES for c in self._commands[m].values()]
+        if self._default:
+            commands.append(self._default)
+        return {f"{c.match}:{c.pattern}": c.stats() for c in commands}
+
+    def _compile(self) -> None:
+        self._regexes = {}
+        for match in ("prefix", "contains"):
+            commands = self._ordered[match] = list(self._commands[match].values())
+            # Alternatives are tried in order, contains ones as lookaheads at the start
+            template = "(?P<c{}>{})" if match == "prefix" else "(?=.*?(?P<c{}>{}))"
+            alternatives = [
+                template.format(i, re.escape(command.pattern))
+                for i, command in enumerate(commands)
+            ]
+            self._regexes[match] = (
+                re.compile("|".join(alternatives), re.DOTALL) if alternatives else None
+            )
@@ -0,0 +1,97 @@
+"""
+Background sends of one proactive message or adaptive card to many chats.
+
+Targets are consumed by a FanOut, which limits the concurrency and the rate of the
+sends and retries the throttled ones.
+"""
+
+import asyncio
+from functools import partial
+from typing import Iterable
+
+from botbuilder.core import BotAdapter, CardFactory, MessageFactory, TurnContext
+from botbuilder.schema import Activity, ConversationAccount, ConversationReference
+
+from config import DefaultConfig
+from utils.fanout import FanOut
+from utils.jobs import JOBS, Job
+
+CONFIG = DefaultConfig()
+
+# Keep a reference to the running sends so they aren't garbage collected
+_TASKS: set[asyncio.Task] = set()
+
+
+def chat_reference(chat_id: str) -> ConversationReference:
+    """The reference used to send proactive messages to a chat."""
+    return ConversationReference(
+        conversation=ConversationAccount(
+            id=chat_id,
+            is_group=True,
+            conversation_type="groupChat",
+            tenant_id=CONFIG.TENANT_ID,
+        ),
+        channel_id="msteams",
+        service_url=CONFIG.SERVICE_URL,
+    )
+
+
+class BulkSend:
+    """Sends the same message (text or adaptive card) to a list of chats."""
+
+    def __init__(
+        self,
+        adapter: BotAdapter,
+        app_id: str,
+        chat_ids: Iterable[str],
+        text: str | None = None,
+        card: dict | None = None,
+        concurrency: int = CONFIG.BROADCAST_CONCURRENCY,
+        rate: float = CONFIG.BROADCAST_RATE,
+        burst: int = CONFIG.BROADCAST_BURST,
+        max_retries: int = CONFIG.BROADCAST_MAX_RETRIES,
+    ):
+        if not text and not card:
+            raise ValueError("A text or a card is required")
+        self._adapter = adapter
+        self._app_id = app_id
+        self._chat_ids = list(dict.fromkeys(chat_ids))
+        self._text = text
+        self._card = card
+        self.job: Job = JOBS.create("proactive", len(self._chat_ids))
+        self._fanout = FanOut(self.job, concurrency, rate, burst, max_retries)
+
+    def start(self) -> Job:
+        """Run the sends in the background and return their job."""
+        task = asyncio.create_task(self._run(), name=f"proactive-{self.job.id}")
+        _TASKS.add(task)
+        task.add_done_callback(_TASKS.discard)
+        return self.job
+
+    def _activity(self) -> Activity:
+        # A new activity per send, the adapter fills it with the conversation
+        if self._card:
+            return MessageFactory.attachment(CardFactory.adaptive_card(self._card))
+        return MessageFactory.text(self._text)
+
+    async def _run(self) -> None:
+        try:
+            for chat_id in self._chat_ids:
+                await self._fanout.submit(chat_id, partial(self._send, chat_id))
+            await self._fanout.wait()
+            self.job.finish()
+        except Exception as e:
+            print(f"\nAPI: Proactive send {self.job.id} failed: {e}")
+            self.job.finish("failed")
+        print(
+            f"\nAPI: Proactive send {self.job.id} sent {self.job.succeeded} of "
+            f"{self.job.total} messages"
+        )
+
+    async def _send(self, chat_id: str) -> None:
+        async def send_activity(turn_context: TurnContext):
+            return await turn_context.send_activity(self._activity())
+
+        await self._adapter.continue_conversation(
+            chat_reference(chat_id), send_activity, self._app_id
+        )
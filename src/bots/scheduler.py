@@ -0,0 +1,98 @@
+"""
+Scheduling of bot turns: the turns of a conversation run one at a time and in order,
+at most `max_concurrency` turns run at the same time, and conversations with pending
+turns take turns (round-robin) so a busy conversation can't starve the others.
+"""
+
+import asyncio
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable
+
+from config import DefaultConfig
+
+CONFIG = DefaultConfig()
+
+
+class TurnScheduler:
+    """Per-conversation serial queues behind a global concurrency cap."""
+
+    def __init__(self, max_concurrency: int = CONFIG.TURN_CONCURRENCY):
+        self._max_concurrency = max_concurrency
+        # Pending turns of every conversation: (func, future, enqueued at)
+        self._queues: dict[str, deque] = {}
+        # Conversations with pending turns and no turn running, in scheduling order
+        self._ready: deque[str] = deque()
+        self._running: set[str] = set()
+        self._tasks: set[asyncio.Task] = set()
+        self.completed = 0
+        self.failed = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.max_depth = 0
+
+    async def run(self, key: str, func: Callable[[], Awaitable]) -> Any:
+        """Run func after the previous turns of the conversation and return its result."""
+        future = asyncio.get_running_loop().create_future()
+        queue = self._queues.setdefault(key, deque())
+        queue.append((func, future, time.monotonic()))
+        self.max_depth = max(self.max_depth, len(queue))
+        if len(queue) == 1 and key not in self._running:
+            self._ready.append(key)
+        self._schedule()
+        return await future
+
+    def _schedule(self) -> None:
+        while len(self._running) < self._max_concurrency and self._ready:
+            key = self._ready.popleft()
+            queue = self._queues[key]
+            func, future, enqueued_at = queue.popleft()
+            if future.cancelled():
+                # The request went away while waiting
+                self._requeue(key)
+                continue
+            wait = time.monotonic() - enqueued_at
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+            self._running.add(key)
+            task = asyncio.create_task(self._execute(key, func, future))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _execute(self, key: str, func: Callable[[], Awaitable], future) -> None:
+        try:
+            result = await func()
+            self.completed += 1
+            if not future.done():
+                future.set_result(result)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            self.failed += 1
+            if not future.done():
+                future.set_exception(e)
+        finally:
+            self._running.discard(key)
+            self._requeue(key)
+            self._schedule()
+
+    def _requeue(self, key: str) -> None:
+        if self._queues[key]:
+            # Back of the line, after the other waiting conversations
+            self._ready.append(key)
+        else:
+            del self._queues[key]
+
+    def stats(self) -> dict:
+        started = self.completed + self.failed + len(self._running)
+        return {
+            "running": len(self._running),
+            "queued": sum(len(queue) for queue in self._queues.values()),
+            "waiting_conversations": len(self._ready),
+            "max_depth": self.max_depth,
+            "completed": self.completed,
+            "failed": self.failed,
+            "avg_wait": self.total_wait / started if started else 0.0,
+            "max_wait": self.max_wait,
+        }
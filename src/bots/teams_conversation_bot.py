@@ -1,17 +1,12 @@
 # Copyright (c) Microsoft Corporation. All rights reserved.
 # Licensed under the MIT License.
 
-import json
-import os
-from typing import List
-
 from botbuilder.core import CardFactory, MessageFactory, TurnContext
 from botbuilder.core.teams import TeamsActivityHandler, TeamsInfo
 from botbuilder.schema import (
     Activity,
     Attachment,
     CardAction,
-    ConversationParameters,
     HeroCard,
     Mention,
 )
@@ -20,9 +15,24 @@ from botbuilder.schema.teams import TeamInfo, TeamsChannelAccount
 from botframework.connector.models import ChannelAccount
 
 from config import DefaultConfig
+from utils import stats
+from utils.cache import TtlLruCache
+from utils.card_templates import CARD_TEMPLATES
+from utils.graph import get_graph
+
+from .broadcast import Broadcast
+from .commands import CommandRouter
 
 CONFIG = DefaultConfig()
-ADAPTIVECARDTEMPLATE = "resources/UserMentionCardTemplate.json"
+ADAPTIVECARDTEMPLATE = "UserMentionCardTemplate"
+
+# Members resolved with TeamsInfo.get_member, keyed by (conversation id, user id)
+MEMBERS = TtlLruCache(max_size=CONFIG.MEMBER_CACHE_SIZE, ttl=CONFIG.MEMBER_CACHE_TTL)
+stats.register("teams_members", MEMBERS.stats)
+
+# Text commands handled by on_message_activity, tried in the order they are defined
+COMMANDS = CommandRouter()
+stats.register("bot_commands", COMMANDS.stats)
 
 
 class TeamsConversationBot(TeamsActivityHandler):
@@ -36,64 +46,43 @@ class TeamsConversationBot(TeamsActivityHandler):
         team_info: TeamInfo,
         turn_context: TurnContext,
     ):
+        get_graph().invalidate_chat(turn_context.activity.conversation.id)
         for member in teams_members_added:
+            MEMBERS.pop((turn_context.activity.conversation.id, member.id))
             if member.id != turn_context.activity.recipient.id:
                 await turn_context.send_activity(
                     f"Welcome to the team { member.given_name } { member.surname }. "
                 )
 
+    async def on_teams_members_removed(  # pylint: disable=unused-argument
+        self,
+        teams_members_removed: list[TeamsChannelAccount],
+        team_info: TeamInfo,
+        turn_context: TurnContext,
+    ):
+        get_graph().invalidate_chat(turn_context.activity.conversation.id)
+        for member in teams_members_removed:
+            MEMBERS.pop((turn_context.activity.conversation.id, member.id))
+
     async def on_message_activity(self, turn_context: TurnContext):
         print(
             f"\nBOT: Received message {turn_context.activity.id}: {turn_context.activity.text}"
         )
-        ref = TurnContext.get_conversation_reference(turn_context.activity)
-
         TurnContext.remove_recipient_mention(turn_context.activity)
         text = turn_context.activity.text.strip().lower()
+        await COMMANDS.dispatch(self, turn_context, text)
 
-        if "mention me" in text:
-            await self._mention_adaptive_card_activity(turn_context)
-            return
-
-        if "mention bot" in text:
-            await self._mention_bot_activity(turn_context)
-            return
-
-        if "mention" in text:
-            await self._mention_activity(turn_context)
-            return
-
-        if "update" in text:
-            await self._send_card(turn_context, True)
-            return
-
-        if "message" in text:
-            await self._message_all_members(turn_context)
-            return
-
-        if "who" in text:
-            await self._get_member(turn_context)
-            return
-
-        if "delete" in text:
-            await self._delete_card_activity(turn_context)
-            return
-
-        if "hi" == text:
-            await self._send_card(turn_context, False)
-
-        await self._echo(turn_context)
-        return
-
+    @COMMANDS.default
     async def _echo(self, turn_context: TurnContext):
         text = turn_context.activity.text.strip().lower()
         reply_activity = MessageFactory.text(f"Echo: {text}")
         await turn_context.send_activity(reply_activity)
 
+    @COMMANDS.command("mention me")
     async def _mention_adaptive_card_activity(self, turn_context: TurnContext):
         member: TeamsChannelAccount = None
         try:
-            member = await TeamsInfo.get_member(
+            member = await self._get_cached_member(
                 turn_context, turn_context.activity.from_property.id
             )
         except Exception as e:
@@ -103,40 +92,29 @@ class TeamsConversationBot(TeamsActivityHandler):
             else:
                 raise
 
-        card_path = os.path.join(os.getcwd(), ADAPTIVECARDTEMPLATE)
-        with open(card_path, "rb") as in_file:
-            template_json = json.load(in_file)
-
-        for t in template_json["body"]:
-            t["text"] = t["text"].replace("${userName}", member.name)
-        for e in template_json["msteams"]["entities"]:
-            e["text"] = e["text"].replace("${userName}", member.name)
-            e["mentioned"]["id"] = e["mentioned"]["id"].replace(
-                "${userUPN}", member.user_principal_name
-            )
-            e["mentioned"]["id"] = e["mentioned"]["id"].replace(
-                "${userAAD}", member.aad_object_id
-            )
-            e["mentioned"]["name"] = e["mentioned"]["name"].replace(
-                "${userName}", member.name
-            )
+        card = CARD_TEMPLATES.render(
+            ADAPTIVECARDTEMPLATE,
+            userName=member.name,
+            userUPN=member.user_principal_name,
+            userAAD=member.aad_object_id,
+        )
 
         adaptive_card_attachment = Activity(
-            attachments=[CardFactory.adaptive_card(template_json)]
+            attachments=[CardFactory.adaptive_card(card)]
         )
         await turn_context.send_activity(adaptive_card_attachment)
 
-    async def _mention_activity(self, turn_context: TurnContext):
-        mention = Mention(
-            mentioned=turn_context.activity.from_property,
-            text=f"<at>{turn_context.activity.from_property.name}</at>",
-            type="mention",
-        )
-
-        reply_activity = MessageFactory.text(f"Hello {mention.text}")
-        reply_activity.entities = [Mention().deserialize(mention.serialize())]
-        await turn_context.send_activity(reply_activity)
-
+    async def _get_cached_member(
+        self, turn_context: TurnContext, user_id: str
+    ) -> TeamsChannelAccount:
+        key = (turn_context.activity.conversation.id, user_id)
+        member = MEMBERS.get(key)
+        if member is None:
+            member = await TeamsInfo.get_member(turn_context, user_id)
+            MEMBERS.set(key, member)
+        return member
+
+    @COMMANDS.command("mention bot")
     async def _mention_bot_activity(self, turn_context: TurnContext):
         """Send a message mentioning the configured bot. Doesn't seem to work."""
         # TODO Debug this further?
@@ -160,6 +138,27 @@ class TeamsConversationBot(TeamsActivityHandler):
         reply_activity.entities = [Mention().deserialize(mention.serialize())]
         await turn_context.send_activity(reply_activity)
 
+    @COMMANDS.command("mention")
+    async def _mention_activity(self, turn_context: TurnContext):
+        mention = Mention(
+            mentioned=turn_context.activity.from_property,
+            text=f"<at>{turn_context.activity.from_property.name}</at>",
+            type="mention",
+        )
+
+        reply_activity = MessageFactory.text(f"Hello {mention.text}")
+        reply_activity.entities = [Mention().deserialize(mention.serialize())]
+        await turn_context.send_activity(reply_activity)
+
+    @COMMANDS.command("hi", match="exact")
+    async def _hi(self, turn_context: TurnContext):
+        await self._send_card(turn_context, False)
+        await self._echo(turn_context)
+
+    @COMMANDS.command("update")
+    async def _update_card(self, turn_context: TurnContext):
+        await self._send_card(turn_context, True)
+
     async def _send_card(self, turn_context: TurnContext, isUpdate):
         buttons = [
             CardAction(
@@ -217,10 +216,24 @@ class TeamsConversationBot(TeamsActivityHandler):
         updated_activity.id = turn_context.activity.reply_to_id
         await turn_context.update_activity(updated_activity)
 
+    @COMMANDS.command("message")
+    async def _message_all_members(self, turn_context: TurnContext):
+        broadcast = Broadcast(
+            turn_context.adapter,
+            self._app_id,
+            TurnContext.get_conversation_reference(turn_context.activity),
+            team_id=TeamsInfo.get_team_id(turn_context),
+        )
+        job = broadcast.start()
+        await turn_context.send_activity(
+            MessageFactory.text(f"Sending a message to all members (job {job.id})")
+        )
+
+    @COMMANDS.command("who")
     async def _get_member(self, turn_context: TurnContext):
         member: TeamsChannelAccount = None
         try:
-            member = await TeamsInfo.get_member(
+            member = await self._get_cached_member(
                 turn_context, turn_context.activity.from_property.id
             )
         except Exception as e:
@@ -231,59 +244,6 @@ class TeamsConversationBot(TeamsActivityHandler):
         else:
             await turn_context.send_activity(f"You are: {member.name}")
 
-    async def _message_all_members(self, turn_context: TurnContext):
-        team_members = await self._get_paged_members(turn_context)
-
-        for member in team_members:
-            conversation_reference = TurnContext.get_conversation_reference(
-                turn_context.activity
-            )
-
-            conversation_parameters = ConversationParameters(
-                is_group=False,
-                bot=turn_context.activity.recipient,
-                members=[member],
-                tenant_id=turn_context.activity.conversation.tenant_id,
-            )
-
-            async def get_ref(tc1):
-                conversation_reference_inner = TurnContext.get_conversation_reference(
-                    tc1.activity
-                )
-                return await tc1.adapter.continue_conversation(
-                    conversation_reference_inner, send_message, self._app_id
-                )
-
-            async def send_message(tc2: TurnContext):
-                return await tc2.send_activity(
-                    f"Hello {member.name}. I'm a Teams conversation bot."
-                )  # pylint: disable=cell-var-from-loop
-
-            await turn_context.adapter.create_conversation(
-                conversation_reference, get_ref, conversation_parameters
-            )
-
-        await turn_context.send_activity(
-            MessageFactory.text("All messages have been sent")
-        )
-
-    async def _get_paged_members(
-        self, turn_context: TurnContext
-    ) -> List[TeamsChannelAccount]:
-        paged_members = []
-        continuation_token = None
-
-        while True:
-            current_page = await TeamsInfo.get_paged_members(
-                turn_context, continuation_token, 100
-            )
-            continuation_token = current_page.continuation_token
-            paged_members.extend(current_page.members)
-
-            if continuation_token is None:
-                break
-
-        return paged_members
-
+    @COMMANDS.command("delete")
     async def _delete_card_activity(self, turn_context: TurnContext):
         await turn_context.delete_activity(turn_context.activity.reply_to_id)
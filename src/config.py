@@ -7,17 +7,75 @@ class DefaultConfig:
     """Bot Configuration"""
 
     PORT = int(os.environ.get("Port", "3978"))
+    # Level of the standard logging output, e.g. DEBUG to log the received activities
+    LOG_LEVEL = os.environ.get("LogLevel", "WARNING")
 
     TENANT_ID = os.environ.get("MicrosoftAppTenantId")
     APP_ID = os.environ.get("MicrosoftAppId")
     APP_PASSWORD = os.environ.get("MicrosoftAppPassword")
     SCOPES = ["https://graph.microsoft.com/.default"]
+    # Entra ID endpoint used to acquire app-only tokens
+    TOKEN_AUTHORITY = os.environ.get(
+        "TokenAuthority", "https://login.microsoftonline.com"
+    )
+    # Seconds before expiration when the app-only tokens are refreshed in the background
+    TOKEN_REFRESH_MARGIN = int(os.environ.get("TokenRefreshMargin", "600"))
+    # Size of the connection pool shared by all Graph requests
+    GRAPH_MAX_CONNECTIONS = int(os.environ.get("GraphMaxConnections", "20"))
+    GRAPH_ENDPOINT = os.environ.get("GraphEndpoint", "https://graph.microsoft.com/v1.0")
+    # Maximum number of $batch requests in flight and retries for throttled requests
+    GRAPH_BATCH_CONCURRENCY = int(os.environ.get("GraphBatchConcurrency", "4"))
+    GRAPH_BATCH_MAX_RETRIES = int(os.environ.get("GraphBatchMaxRetries", "5"))
 
     WEBHOOK_URL = os.environ.get("WebhookUrl")
     GRAPH_NOTIFICATION_EXPIRATION = int(
         os.environ.get("GraphNotificationExpiration", "1800")
     )  # 30 minutes in seconds
 
+    # Seconds after which the local subscription registry is fully synced with Graph again
+    SUBSCRIPTION_SYNC_INTERVAL = int(os.environ.get("SubscriptionSyncInterval", "3600"))
+
+    # Subscriptions are renewed this many seconds before they expire, plus a random
+    # jitter of up to SUBSCRIPTION_RENEW_JITTER seconds to spread the renewals
+    SUBSCRIPTION_RENEW_AHEAD = int(os.environ.get("SubscriptionRenewAhead", "300"))
+    SUBSCRIPTION_RENEW_JITTER = int(os.environ.get("SubscriptionRenewJitter", "60"))
+
+    # Members, installed bots and permission grants of a chat are cached this long
+    CHAT_METADATA_CACHE_TTL = int(os.environ.get("ChatMetadataCacheTtl", "300"))
+    CHAT_METADATA_CACHE_SIZE = int(os.environ.get("ChatMetadataCacheSize", "1000"))
+
+    # Members resolved by the bot are cached per conversation this long
+    MEMBER_CACHE_TTL = int(os.environ.get("MemberCacheTtl", "600"))
+    MEMBER_CACHE_SIZE = int(os.environ.get("MemberCacheSize", "10000"))
+
+    # Proactive messages sent to all members: parallel sends, messages per second and burst
+    BROADCAST_CONCURRENCY = int(os.environ.get("BroadcastConcurrency", "8"))
+    BROADCAST_RATE = float(os.environ.get("BroadcastRate", "5"))
+    BROADCAST_BURST = int(os.environ.get("BroadcastBurst", "10"))
+    BROADCAST_MAX_RETRIES = int(os.environ.get("BroadcastMaxRetries", "5"))
+
+    # Maximum number of bot turns handled at the same time (across all conversations)
+    TURN_CONCURRENCY = int(os.environ.get("TurnConcurrency", "32"))
+
+    # SQLite database with the 1:1 conversations opened with users, and the number of
+    # them kept in memory
+    CONVERSATION_STORE_PATH = os.environ.get(
+        "ConversationStorePath", "conversations.db"
+    )
+    CONVERSATION_CACHE_SIZE = int(os.environ.get("ConversationCacheSize", "10000"))
+
+    # Directory of the adaptive card templates, and how often (in seconds) the files are
+    # checked for changes. 0 loads them only once, set it to a few seconds in development
+    CARD_TEMPLATES_DIR = os.environ.get("CardTemplatesDir", "resources")
+    CARD_TEMPLATES_RELOAD_INTERVAL = float(
+        os.environ.get("CardTemplatesReloadInterval", "0")
+    )
+
+    # File where the delta checkpoints of the chat message exports are kept
+    MESSAGE_EXPORT_CHECKPOINTS = os.environ.get(
+        "MessageExportCheckpoints", "export_checkpoints.json"
+    )
+
     # Should be static and secret. Used to validate the notification is coming from Graph
     GRAPH_WEBHOOK_STATE = os.environ.get("GraphWebhookState")
 
@@ -32,3 +90,65 @@ class DefaultConfig:
     NOTIFICATION_KEY_ID = os.environ.get("NotificationKeyId")
     NOTIFICATION_PUBLIC_KEY = os.environ.get("NotificationPublicKey")
     NOTIFICATION_PRIVATE_KEY = os.environ.get("NotificationPrivateKey")
+    # Additional private keys for rotation, in the format "keyId=path;keyId2=path2"
+    NOTIFICATION_PRIVATE_KEY_FILES = os.environ.get("NotificationPrivateKeyFiles", "")
+    # Seconds between checks for changes in the private key files
+    NOTIFICATION_KEY_RELOAD_INTERVAL = int(
+        os.environ.get("NotificationKeyReloadInterval", "30")
+    )
+    # Decrypted notification data keys are reused for repeated dataKey values
+    DATA_KEY_CACHE_SIZE = int(os.environ.get("DataKeyCacheSize", "256"))
+    DATA_KEY_CACHE_TTL = int(os.environ.get("DataKeyCacheTtl", "3600"))
+
+    # Where encrypted notifications are decrypted and parsed: "inline", "thread" or "process"
+    NOTIFICATION_WORKER_MODE = os.environ.get("NotificationWorkerMode", "thread")
+    # Number of workers in the pool. Defaults to the number of CPUs.
+    NOTIFICATION_WORKERS = int(os.environ.get("NotificationWorkers", "0")) or None
+    # Maximum number of notifications waiting for or being processed by a worker
+    NOTIFICATION_MAX_PENDING = int(os.environ.get("NotificationMaxPending", "100"))
+
+    # How the webhook handles notifications: "inline" processes them before answering,
+    # "queue" answers 202 right away and processes them in the background
+    NOTIFICATION_INGESTION_MODE = os.environ.get("NotificationIngestionMode", "queue")
+    NOTIFICATION_QUEUE_CONSUMERS = int(
+        os.environ.get("NotificationQueueConsumers", "8")
+    )
+    NOTIFICATION_QUEUE_SIZE = int(os.environ.get("NotificationQueueSize", "10000"))
+    # Seconds to wait for room in a full queue before answering 503 to Graph
+    NOTIFICATION_QUEUE_PUT_TIMEOUT = float(
+        os.environ.get("NotificationQueuePutTimeout", "1")
+    )
+    # Seconds to keep processing queued notifications when the app shuts down
+    NOTIFICATION_QUEUE_DRAIN_TIMEOUT = float(
+        os.environ.get("NotificationQueueDrainTimeout", "30")
+    )
+    # Notifications with the same subscription, resource and change type received
+    # within this many seconds are dropped as duplicates
+    NOTIFICATION_DEDUP_WINDOW = int(os.environ.get("NotificationDedupWindow", "600"))
+    NOTIFICATION_DEDUP_SIZE = int(os.environ.get("NotificationDedupSize", "100000"))
+    # Directory where queued notifications are kept until processed. Empty to disable.
+    NOTIFICATION_SPOOL_DIR = os.environ.get("NotificationSpoolDir", "")
+    NOTIFICATION_SPOOL_SEGMENT_SIZE = int(
+        os.environ.get("NotificationSpoolSegmentSize", str(16 * 1024 * 1024))
+    )
+    # Seconds to batch appends before calling fsync
+    NOTIFICATION_SPOOL_FSYNC_INTERVAL = float(
+        os.environ.get("NotificationSpoolFsyncInterval", "0.005")
+    )
+
+    # Signing keys used to verify JWTs are cached and refreshed after this many seconds
+    JWKS_CACHE_TTL = int(os.environ.get("JwksCacheTtl", "86400"))
+    # Seconds between background refreshes of the Graph signing keys
+    JWKS_REFRESH_INTERVAL = int(os.environ.get("JwksRefreshInterval", "3600"))
+    # Minimum seconds between forced refreshes triggered by an unknown key id
+    JWKS_MIN_REFRESH_INTERVAL = int(os.environ.get("JwksMinRefreshInterval", "60"))
+    # Maximum number of validated Graph validation tokens remembered until they expire
+    VALIDATED_TOKENS_CACHE_SIZE = int(
+        os.environ.get("ValidatedTokensCacheSize", "1024")
+    )
+    # Maximum number of validated Bot Framework tokens remembered until they expire, and
+    # seconds between background refreshes of the channel signing keys
+    BOT_AUTH_CACHE_SIZE = int(os.environ.get("BotAuthCacheSize", "1024"))
+    BOT_SIGNING_KEYS_REFRESH_INTERVAL = int(
+        os.environ.get("BotSigningKeysRefreshInterval", "3600")
+    )
@@ -0,0 +1,90 @@
+"""
+A small in-memory cache with a bounded size (LRU eviction) and per-entry expiration.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable
+
+
+class TtlLruCache:
+    """A thread-safe LRU cache where every entry expires at its own deadline."""
+
+    def __init__(
+        self,
+        max_size: int,
+        ttl: float | None = None,
+        on_evict: Callable[[Hashable, Any], None] | None = None,
+    ):
+        self._max_size = max_size
+        self._ttl = ttl
+        self._on_evict = on_evict
+        self._entries: OrderedDict[Hashable, tuple[Any, float]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(
+        self,
+        key: Hashable,
+        default: Any = None,
+        transform: Callable[[Any], Any] | None = None,
+    ) -> Any:
+        """
+        Return the value of a key. `transform` is applied to the value while the lock is
+        held, e.g. to copy a value that `on_evict` may modify.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            value, expires_at = entry
+            if expires_at <= time.time():
+                self._remove(key)
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return transform(value) if transform else value
+
+    def set(self, key: Hashable, value: Any, expires_at: float | None = None) -> None:
+        """Store a value until the given epoch time, or for the default TTL."""
+        if expires_at is None:
+            expires_at = time.time() + self._ttl if self._ttl else float("inf")
+        if self._ttl:
+            expires_at = min(expires_at, time.time() + self._ttl)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, expires_at)
+            while len(self._entries) > self._max_size:
+                self._remove(next(iter(self._entries)))
+
+    def pop(self, key: Hashable) -> None:
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            for key in list(self._entries):
+                self._remove(key)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / total if total else 0.0,
+        }
+
+    def _remove(self, key: Hashable) -> None:
+        value, _ = self._entries.pop(key)
+        if self._on_evict:
+            self._on_evict(key, value)
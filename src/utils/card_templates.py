@@ -0,0 +1,149 @@
+"""
+Adaptive card templates loaded once from disk and compiled into renderers.
+
+A template is a JSON document with `${name}` placeholders in its strings. Compiling it
+records which parts of the document contain placeholders, so rendering only rebuilds
+those containers and strings and shares every constant subtree with the template.
+Rendered cards must therefore be treated as read-only.
+"""
+
+import json
+import os
+import re
+import threading
+import time
+from typing import Any, Callable
+
+from config import DefaultConfig
+from utils import stats
+
+CONFIG = DefaultConfig()
+
+PLACEHOLDER = re.compile(r"\$\{(\w+)\}")
+
+# Renders a part of the template from the values of the placeholders
+Renderer = Callable[[dict], Any]
+
+
+def _compile_string(value: str) -> Renderer | None:
+    if not PLACEHOLDER.search(value):
+        return None
+    # Turn the string into a format string: "Hi {x} ${name}" -> "Hi {{x}} {name}"
+    parts = PLACEHOLDER.split(value)
+    # split() alternates literal text and placeholder names
+    for i in range(0, len(parts), 2):
+        parts[i] = parts[i].replace("{", "{{").replace("}", "}}")
+    for i in range(1, len(parts), 2):
+        parts[i] = "{" + parts[i] + "}"
+    return "".join(parts).format_map
+
+
+def _compile(node: Any) -> Renderer | None:
+    """Compile a JSON node, or return None if it has no placeholders."""
+    if isinstance(node, str):
+        return _compile_string(node)
+
+    if isinstance(node, dict):
+        slots = [
+            (key, r) for key, r in ((k, _compile(v)) for k, v in node.items()) if r
+        ]
+        if not slots:
+            return None
+
+        def render_dict(values: dict) -> dict:
+            result = node.copy()
+            for key, render in slots:
+                result[key] = render(values)
+            return result
+
+        return render_dict
+
+    if isinstance(node, list):
+        slots = [(i, r) for i, r in ((i, _compile(v)) for i, v in enumerate(node)) if r]
+        if not slots:
+            return None
+
+        def render_list(values: dict) -> list:
+            result = node.copy()
+            for index, render in slots:
+                result[index] = render(values)
+            return result
+
+        return render_list
+
+    return None
+
+
+class CardTemplate:
+    """A compiled adaptive card template."""
+
+    def __init__(self, name: str, document: dict):
+        self.name = name
+        self.document = document
+        self.placeholders = frozenset(PLACEHOLDER.findall(json.dumps(document)))
+        self._render = _compile(document)
+
+    def render(self, **values: Any) -> dict:
+        """Return the card with the placeholders replaced by the given values."""
+        if not values.keys() >= self.placeholders:
+            missing = self.placeholders.difference(values)
+            raise KeyError(f"Missing values for card template {self.name}: {missing}")
+        if self._render is None:
+            return self.document
+        return self._render(values)
+
+
+class CardTemplateStore:
+    """
+    The card templates of a directory, indexed by file name without extension.
+
+    With a reload interval, the files are checked for changes at most that often when a
+    template is requested, which is meant for development.
+    """
+
+    def __init__(self, directory: str, reload_interval: float = 0):
+        self._directory = directory
+        self._reload_interval = reload_interval
+        self._templates: dict[str, CardTemplate] = {}
+        self._mtimes: dict[str, float] = {}
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self.renders = 0
+
+    def get(self, name: str) -> CardTemplate:
+        if (
+            self._reload_interval
+            and time.monotonic() - self._checked_at > self._reload_interval
+        ) or not self._checked_at:
+            self.load()
+        return self._templates[name]
+
+    def render(self, name: str, **values: Any) -> dict:
+        card = self.get(name).render(**values)
+        self.renders += 1
+        return card
+
+    def load(self) -> None:
+        """Compile the templates that are new or have changed since the last check."""
+        with self._lock:
+            for entry in os.scandir(self._directory):
+                if not entry.name.endswith(".json"):
+                    continue
+                mtime = entry.stat().st_mtime
+                if self._mtimes.get(entry.name) == mtime:
+                    continue
+                name = entry.name[: -len(".json")]
+                with open(entry.path, "rb") as template_file:
+                    self._templates[name] = CardTemplate(name, json.load(template_file))
+                self._mtimes[entry.name] = mtime
+                print(f"Cards: Loaded card template {name}")
+            self._checked_at = time.monotonic()
+
+    def stats(self) -> dict:
+        return {"templates": len(self._templates), "renders": self.renders}
+
+
+CARD_TEMPLATES = CardTemplateStore(
+    CONFIG.CARD_TEMPLATES_DIR, CONFIG.CARD_TEMPLATES_RELOAD_INTERVAL
+)
+stats.register("card_templates", CARD_TEMPLATES.stats)
@@ -0,0 +1,108 @@
+"""
+Persistent map of (tenant id, user AAD id) to the reference of the bot's 1:1
+conversation with that user, so proactive messages can skip create_conversation.
+"""
+
+import asyncio
+import json
+import sqlite3
+import threading
+
+from botbuilder.schema import ConversationReference
+
+from config import DefaultConfig
+from utils import stats
+from utils.cache import TtlLruCache
+
+CONFIG = DefaultConfig()
+
+
+class ConversationStore:
+    """
+    SQLite-backed store of conversation references with an in-memory front cache.
+
+    The database is opened on first use and queried in worker threads, so cache misses
+    and writes don't block the event loop.
+    """
+
+    def __init__(self, path: str, cache_size: int = CONFIG.CONVERSATION_CACHE_SIZE):
+        self._path = path
+        self._connection: sqlite3.Connection | None = None
+        self._lock = threading.Lock()
+        self._cache = TtlLruCache(max_size=cache_size)
+
+    def _connect(self) -> sqlite3.Connection:
+        # Called with the lock held
+        if self._connection is None:
+            self._connection = sqlite3.connect(self._path, check_same_thread=False)
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS conversations ("
+                " tenant_id TEXT NOT NULL,"
+                " user_id TEXT NOT NULL,"
+                " reference TEXT NOT NULL,"
+                " PRIMARY KEY (tenant_id, user_id))"
+            )
+            self._connection.commit()
+        return self._connection
+
+    async def get(self, tenant_id: str, user_id: str) -> ConversationReference | None:
+        key = (tenant_id, user_id)
+        reference = self._cache.get(key)
+        if reference is not None:
+            return reference
+        row = await asyncio.to_thread(self._select, key)
+        if row is None:
+            return None
+        reference = ConversationReference.from_dict(json.loads(row[0]))
+        self._cache.set(key, reference)
+        return reference
+
+    async def put(
+        self, tenant_id: str, user_id: str, reference: ConversationReference
+    ) -> None:
+        key = (tenant_id, user_id)
+        await asyncio.to_thread(
+            self._execute,
+            "INSERT OR REPLACE INTO conversations VALUES (?, ?, ?)",
+            (*key, json.dumps(reference.as_dict())),
+        )
+        self._cache.set(key, reference)
+
+    async def remove(self, tenant_id: str, user_id: str) -> None:
+        key = (tenant_id, user_id)
+        self._cache.pop(key)
+        await asyncio.to_thread(
+            self._execute,
+            "DELETE FROM conversations WHERE tenant_id = ? AND user_id = ?",
+            key,
+        )
+
+    def _select(self, key: tuple[str, str]) -> tuple | None:
+        with self._lock:
+            cursor = self._connect().execute(
+                "SELECT reference FROM conversations WHERE tenant_id = ? AND user_id = ?",
+                key,
+            )
+            return cursor.fetchone()
+
+    def _execute(self, statement: str, parameters: tuple) -> None:
+        with self._lock:
+            connection = self._connect()
+            connection.execute(statement, parameters)
+            connection.commit()
+
+    def stats(self) -> dict:
+        return self._cache.stats()
+
+    async def close(self) -> None:
+        await asyncio.to_thread(self._close)
+
+    def _close(self) -> None:
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+
+CONVERSATIONS = ConversationStore(CONFIG.CONVERSATION_STORE_PATH)
+stats.register("conversations", CONVERSATIONS.stats)
@@ -1,34 +1,182 @@
+import asyncio
 import base64
-from cryptography.hazmat.primitives import serialization, hashes, hmac
-from cryptography.hazmat.primitives.asymmetric import padding
+import hashlib
+import os
+import threading
+import time
+
+from cryptography.hazmat.primitives import hashes, hmac
 from cryptography.hazmat.primitives import padding as symmetric_padding
-from config import DefaultConfig
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import padding
+from cryptography.hazmat.primitives.asymmetric.rsa import RSAPrivateKey
 from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
 
+from config import DefaultConfig
+from utils import stats
+from utils.cache import TtlLruCache
 
 CONFIG = DefaultConfig()
 
 
-def _decrypt_symmetric_key(dataKey: str):
-    with open("notifications.key", "rb") as key_file:
-        private_key = serialization.load_pem_private_key(
-            key_file.read(),
-            password=None,
-        )
-
-        # convert dataKey to bytes from base64
-        dataKey_bytes = base64.b64decode(dataKey)
-
-        # decrypt dataKey using private key
-        decrypted_key = private_key.decrypt(
-            dataKey_bytes,
-            padding.OAEP(
-                mgf=padding.MGF1(algorithm=hashes.SHA1()),
-                algorithm=hashes.SHA1(),
-                label=None,
-            ),
-        )
-        return decrypted_key
+class UnknownKeyError(KeyError):
+    """A notification was encrypted with a certificate we have no private key for."""
+
+
+class NotificationKeyManager:
+    """
+    Holds the parsed private keys used to decrypt Graph notifications, indexed by the
+    encryptionCertificateId of the subscription.
+
+    Keys are loaded from PEM files and reloaded when a file changes. The files are
+    checked every `reload_interval` seconds by a background task, so decrypting a
+    notification does not touch the disk. Processes without the background task (e.g.
+    the workers of a process pool) check the files when a key is requested instead.
+    """
+
+    def __init__(
+        self,
+        key_files: dict[str, str],
+        fallback_pem: str | None = None,
+        reload_interval: float = CONFIG.NOTIFICATION_KEY_RELOAD_INTERVAL,
+    ):
+        self._key_files = key_files
+        self._fallback_pem = fallback_pem
+        self._reload_interval = reload_interval
+        self._keys: dict[str, RSAPrivateKey] = {}
+        self._mtimes: dict[str, float] = {}
+        self._fallback: RSAPrivateKey | None = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self._task: asyncio.Task | None = None
+
+    def get_key(self, key_id: str | None = None) -> RSAPrivateKey:
+        """Return the private key for the given certificate id (or the default key)."""
+        if (
+            self._task is None
+            and time.monotonic() - self._checked_at > self._reload_interval
+        ):
+            self.reload()
+        key = self._keys.get(key_id) if key_id else None
+        if key is None:
+            if key_id and key_id != CONFIG.NOTIFICATION_KEY_ID:
+                raise UnknownKeyError(
+                    f"No private key for encryptionCertificateId: {key_id}"
+                )
+            key = self._default_key()
+        if key is None:
+            raise KeyError(f"No private key available for certificate id: {key_id}")
+        return key
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._keep_fresh(), name="notification-keys")
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _keep_fresh(self) -> None:
+        while True:
+            await asyncio.sleep(self._reload_interval)
+            try:
+                await asyncio.to_thread(self.reload)
+            except Exception as e:
+                print(f"Crypto: Error reloading the notification keys: {e}")
+
+    def reload(self) -> None:
+        """Load the key files that are new or have changed since the last check."""
+        with self._lock:
+            for key_id, path in self._key_files.items():
+                try:
+                    mtime = os.stat(path).st_mtime
+                except FileNotFoundError:
+                    continue
+                if self._mtimes.get(key_id) == mtime:
+                    continue
+                with open(path, "rb") as key_file:
+                    self._keys[key_id] = serialization.load_pem_private_key(
+                        key_file.read(),
+                        password=None,
+                    )
+                self._mtimes[key_id] = mtime
+                print(f"Crypto: Loaded notification key {key_id} from {path}")
+            if self._fallback is None and self._fallback_pem:
+                self._fallback = serialization.load_pem_private_key(
+                    self._fallback_pem.replace("\\n", "\n").encode("utf-8"),
+                    password=None,
+                )
+            self._checked_at = time.monotonic()
+
+    def _default_key(self) -> RSAPrivateKey | None:
+        key = self._keys.get(CONFIG.NOTIFICATION_KEY_ID)
+        if key is None and self._keys:
+            key = next(iter(self._keys.values()))
+        return key or self._fallback
+
+
+def _parse_key_files(value: str) -> dict[str, str]:
+    """Parse a list of key files in the format 'keyId=path;keyId2=path2'."""
+    key_files = {}
+    for entry in filter(None, value.split(";")):
+        key_id, _, path = entry.partition("=")
+        key_files[key_id.strip()] = path.strip()
+    return key_files
+
+
+NOTIFICATION_KEYS = NotificationKeyManager(
+    {
+        CONFIG.NOTIFICATION_KEY_ID: "notifications.key",
+        **_parse_key_files(CONFIG.NOTIFICATION_PRIVATE_KEY_FILES),
+    },
+    fallback_pem=CONFIG.NOTIFICATION_PRIVATE_KEY,
+)
+
+
+def _wipe_key(digest: str, key: bytearray) -> None:
+    """Overwrite an evicted symmetric key so it doesn't linger in memory."""
+    for i in range(len(key)):
+        key[i] = 0
+
+
+# Decrypted symmetric keys indexed by the digest of the encrypted dataKey
+SYMMETRIC_KEYS = TtlLruCache(
+    max_size=CONFIG.DATA_KEY_CACHE_SIZE,
+    ttl=CONFIG.DATA_KEY_CACHE_TTL,
+    on_evict=_wipe_key,
+)
+stats.register("notification_data_keys", SYMMETRIC_KEYS.stats)
+
+
+def _decrypt_symmetric_key(dataKey: str, key_id: str | None = None) -> bytes:
+    digest = hashlib.sha256(f"{key_id}:{dataKey}".encode("utf-8")).hexdigest()
+    # Copy the key before an eviction can wipe it
+    cached_key = SYMMETRIC_KEYS.get(digest, transform=bytes)
+    if cached_key is not None:
+        return cached_key
+
+    decrypted_key = _rsa_decrypt_symmetric_key(dataKey, key_id)
+    SYMMETRIC_KEYS.set(digest, bytearray(decrypted_key))
+    return decrypted_key
+
+
+def _rsa_decrypt_symmetric_key(dataKey: str, key_id: str | None = None) -> bytes:
+    private_key = NOTIFICATION_KEYS.get_key(key_id)
+
+    # convert dataKey to bytes from base64
+    dataKey_bytes = base64.b64decode(dataKey)
+
+    # decrypt dataKey using private key
+    decrypted_key = private_key.decrypt(
+        dataKey_bytes,
+        padding.OAEP(
+            mgf=padding.MGF1(algorithm=hashes.SHA1()),
+            algorithm=hashes.SHA1(),
+            label=None,
+        ),
+    )
+    return decrypted_key
 
 
 def _calculate_signature(key: bytes, data: bytes) -> str:
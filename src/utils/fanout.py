@@ -0,0 +1,59 @@
+"""
+Fan-out of many sends (proactive messages) with a pool of senders limited both in
+concurrency and in rate (token bucket). Throttled (429) sends are retried after
+Retry-After, and the outcome of every send is recorded in a job.
+"""
+
+import asyncio
+from typing import Awaitable, Callable
+
+from config import DefaultConfig
+from utils.jobs import Job
+from utils.rate_limit import TokenBucket, retry_after
+
+CONFIG = DefaultConfig()
+
+
+class FanOut:
+    """Runs the sends of a job, retrying the throttled ones."""
+
+    def __init__(
+        self,
+        job: Job,
+        concurrency: int = CONFIG.BROADCAST_CONCURRENCY,
+        rate: float = CONFIG.BROADCAST_RATE,
+        burst: int = CONFIG.BROADCAST_BURST,
+        max_retries: int = CONFIG.BROADCAST_MAX_RETRIES,
+    ):
+        self._job = job
+        self._slots = asyncio.Semaphore(concurrency)
+        self._bucket = TokenBucket(rate, burst)
+        self._max_retries = max_retries
+        self._tasks: set[asyncio.Task] = set()
+
+    async def submit(self, target: str, send: Callable[[], Awaitable]) -> None:
+        """Start a send once a sender is free, so callers can produce targets lazily."""
+        await self._slots.acquire()
+        task = asyncio.create_task(self._send(target, send))
+        task.add_done_callback(lambda _: self._slots.release())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def wait(self) -> None:
+        """Wait for the sends that were submitted."""
+        await asyncio.gather(*self._tasks)
+
+    async def _send(self, target: str, send: Callable[[], Awaitable]) -> None:
+        for attempt in range(self._max_retries + 1):
+            await self._bucket.acquire()
+            try:
+                await send()
+                self._job.success()
+                return
+            except Exception as e:
+                delay = retry_after(e)
+                if delay is None or attempt == self._max_retries:
+                    self._job.failure(target, e)
+                    return
+                self._job.retried += 1
+                self._bucket.pause(delay)
@@ -3,11 +3,22 @@ This module provides a class to interact with the Microsoft Graph API using app-
 It includes methods for managing subscriptions, listing chat members and bots, and handling chat messages.
 """
 
+import asyncio
+import json
+import urllib.parse
 from datetime import datetime, timedelta, timezone
+from typing import AsyncIterator
 
+import httpx
 from azure.identity.aio import ClientSecretCredential
-from msgraph import GraphServiceClient
+from kiota_authentication_azure.azure_identity_authentication_provider import (
+    AzureIdentityAuthenticationProvider,
+)
+from kiota_serialization_json.json_parse_node_factory import JsonParseNodeFactory
+from kiota_serialization_json.json_serialization_writer import JsonSerializationWriter
+from msgraph import GraphRequestAdapter, GraphServiceClient
 from msgraph.generated.chats.chats_request_builder import ChatsRequestBuilder
+from msgraph.generated.models.message import Message
 from msgraph.generated.models.subscription import Subscription
 from msgraph.generated.models.teams_app_installation import TeamsAppInstallation
 from msgraph.generated.models.teams_app_permission_set import TeamsAppPermissionSet
@@ -17,8 +28,15 @@ from msgraph.generated.models.teams_app_resource_specific_permission import (
 from msgraph.generated.models.teams_app_resource_specific_permission_type import (
     TeamsAppResourceSpecificPermissionType,
 )
+from msgraph_core import GraphClientFactory
 
 from config import DefaultConfig
+from utils.cache import TtlLruCache
+from utils.graph_batch import GraphBatcher
+from utils.rate_limit import parse_retry_after
+from utils.renewal import RenewalScheduler
+from utils.subscription_registry import SubscriptionRegistry
+from utils.token_manager import GRAPH_TOKEN, ManagedTokenCredential
 
 CONFIG = DefaultConfig()
 
@@ -35,21 +53,94 @@ https://learn.microsoft.com/en-us/graph/api/chat-post-installedapps?view=graph-r
 """
 
 
+def parse_message(content: str) -> Message:
+    """Parse the JSON payload of a chat message notification."""
+    return parse_object(content, Message)
+
+
+def parse_object(content: str | dict, model):
+    """Parse a JSON payload (e.g. the body of a batched response) into a Graph model."""
+    if isinstance(content, dict):
+        content = json.dumps(content)
+    node = JsonParseNodeFactory().get_root_parse_node(
+        content_type="application/json", content=content.encode("utf-8")
+    )
+    return node.get_object_value(model)
+
+
+def serialize_object(value) -> dict:
+    """Serialize a Graph model into the JSON body of a batched request."""
+    writer = JsonSerializationWriter()
+    writer.write_object_value(None, value)
+    return json.loads(writer.get_serialized_content())
+
+
+# Sections of the chat info that are cached per chat
+CHAT_METADATA_KEYS = ("permissions", "members", "bots")
+
+
+def _batch_error(response: dict) -> dict:
+    body = response.get("body")
+    message = body.get("error", {}).get("message") if isinstance(body, dict) else body
+    return {"status": "error", "code": response.get("status"), "error": message}
+
+
+_GRAPH: "Graph | None" = None
+
+
+def get_graph() -> "Graph":
+    """Return the Graph client shared by the whole process."""
+    global _GRAPH
+    if _GRAPH is None:
+        _GRAPH = Graph()
+    return _GRAPH
+
+
+async def close_graph() -> None:
+    global _GRAPH
+    if _GRAPH is not None:
+        await _GRAPH.close()
+        _GRAPH = None
+
+
 class Graph:
     """A class to interact with Microsoft Graph API using app-only authentication."""
 
-    client_credential: ClientSecretCredential
+    client_credential: ClientSecretCredential | ManagedTokenCredential
     app_client: GraphServiceClient
 
-    def __init__(self):
-        tenant_id = CONFIG.TENANT_ID
-        client_id = CONFIG.APP_ID
-        client_secret = CONFIG.APP_PASSWORD
-
-        self.client_credential = ClientSecretCredential(
-            tenant_id, client_id, client_secret
+    def __init__(
+        self, credential: ClientSecretCredential | ManagedTokenCredential = None
+    ):
+        # The token is refreshed in the background by the token manager
+        self.client_credential = credential or ManagedTokenCredential(GRAPH_TOKEN)
+        # Keep-alive connections are reused by every request made with this instance
+        self.http_client = GraphClientFactory.create_with_default_middleware(
+            client=httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=CONFIG.GRAPH_MAX_CONNECTIONS,
+                    max_keepalive_connections=CONFIG.GRAPH_MAX_CONNECTIONS,
+                ),
+            )
+        )
+        auth_provider = AzureIdentityAuthenticationProvider(
+            self.client_credential, scopes=CONFIG.SCOPES
+        )
+        self.app_client = GraphServiceClient(
+            request_adapter=GraphRequestAdapter(auth_provider, client=self.http_client)
         )
-        self.app_client = GraphServiceClient(self.client_credential)
+        self.app_client.request_adapter.base_url = CONFIG.GRAPH_ENDPOINT
+        self.batcher = GraphBatcher(self.http_client, self.get_app_only_token)
+        self.subscriptions = SubscriptionRegistry()
+        self.chat_metadata = TtlLruCache(
+            max_size=CONFIG.CHAT_METADATA_CACHE_SIZE, ttl=CONFIG.CHAT_METADATA_CACHE_TTL
+        )
+        self.renewals = RenewalScheduler(self)
+
+    async def close(self):
+        await self.renewals.stop()
+        await self.http_client.aclose()
+        await self.client_credential.close()
 
     async def get_app_only_token(self):
         graph_scope = "https://graph.microsoft.com/.default"
@@ -117,6 +208,145 @@ class Graph:
                 if mention.mentioned.user:
                     print(f"Graph: Mentioned: {mention.mentioned.user.display_name}")
 
+    async def sync_subscriptions(self) -> None:
+        """Load every subscription into the local registry."""
+        try:
+            await self.subscriptions.sync(self.app_client)
+        except Exception as e:
+            print(f"Graph: Error syncing subscriptions: {e}")
+
+    async def get_chat_info(self, chat_id: str) -> dict:
+        """
+        Get the permissions, members, bots and last messages of a chat in one $batch.
+
+        The permissions, members and bots are cached per chat until they expire or the
+        chat is invalidated.
+        """
+        metadata = self.chat_metadata.get(chat_id)
+        requests = [
+            {
+                "id": "messages",
+                "method": "GET",
+                "url": f"/chats/{chat_id}/messages?$top=10",
+            },
+        ]
+        if metadata is None:
+            requests += [
+                {
+                    "id": "permissions",
+                    "method": "GET",
+                    "url": f"/chats/{chat_id}/permissionGrants",
+                },
+                {"id": "members", "method": "GET", "url": f"/chats/{chat_id}/members"},
+                {
+                    "id": "bots",
+                    "method": "GET",
+                    "url": f"/chats/{chat_id}/installedApps?$expand=teamsAppDefinition($expand=bot)",
+                },
+            ]
+        responses = await self.batcher.send(requests)
+        info = {"chat_id": chat_id}
+        for key, response in responses.items():
+            if response["status"] != 200:
+                info[key] = _batch_error(response)
+                continue
+            values = response["body"].get("value", [])
+            if key == "permissions":
+                info[key] = [
+                    {
+                        "permission": p.get("permission"),
+                        "permission_type": p.get("permissionType"),
+                    }
+                    for p in values
+                ]
+            elif key == "members":
+                # Members don't include bots/agents
+                info[key] = [
+                    {
+                        "type": m.get("@odata.type"),
+                        "display_name": m.get("displayName"),
+                        "user_id": m.get("userId"),
+                    }
+                    for m in values
+                ]
+            elif key == "bots":
+                info[key] = [
+                    {
+                        "name": a["teamsAppDefinition"].get("displayName"),
+                        "id": a["teamsAppDefinition"].get("id"),
+                        "version": a["teamsAppDefinition"].get("version"),
+                        "bot_id": a["teamsAppDefinition"]["bot"].get("id"),
+                    }
+                    for a in values
+                    if (a.get("teamsAppDefinition") or {}).get("bot")
+                ]
+            elif key == "messages":
+                info[key] = [
+                    {
+                        "id": m.get("id"),
+                        "content": (m.get("body") or {}).get("content"),
+                        "mentions": [
+                            (
+                                mention["mentioned"].get("application")
+                                or mention["mentioned"].get("user")
+                                or {}
+                            ).get("displayName")
+                            for mention in m.get("mentions") or []
+                        ],
+                    }
+                    for m in values
+                ]
+        if metadata is not None:
+            info.update(metadata)
+        elif all(isinstance(info.get(key), list) for key in CHAT_METADATA_KEYS):
+            self.chat_metadata.set(
+                chat_id, {key: info[key] for key in CHAT_METADATA_KEYS}
+            )
+        return info
+
+    def invalidate_chat(self, chat_id: str) -> None:
+        """Forget the cached members, bots and permissions of a chat."""
+        self.chat_metadata.pop(chat_id)
+
+    async def iter_chat_messages(
+        self, chat_id: str, since: str | None = None, page_size: int = 50
+    ) -> AsyncIterator[dict]:
+        """
+        Yield every message of a chat as raw JSON, one page at a time.
+
+        If `since` is given, only the messages modified after that ISO timestamp are
+        returned. Chats don't support /messages/delta, so the lastModifiedDateTime
+        filter is used to only fetch what changed since a previous run.
+        """
+        query = {"$top": page_size}
+        if since:
+            query["$filter"] = f"lastModifiedDateTime gt {since}"
+            query["$orderby"] = "lastModifiedDateTime desc"
+        url = (
+            f"{CONFIG.GRAPH_ENDPOINT}/chats/{chat_id}/messages?"
+            f"{urllib.parse.urlencode(query, quote_via=urllib.parse.quote)}"
+        )
+        while url:
+            page = await self._get_json(url)
+            for message in page.get("value", []):
+                yield message
+            url = page.get("@odata.nextLink")
+
+    async def _get_json(self, url: str, max_retries: int = 5) -> dict:
+        """GET an absolute Graph URL, waiting and retrying when throttled."""
+        for attempt in range(max_retries + 1):
+            token = await self.get_app_only_token()
+            response = await self.http_client.get(
+                url, headers={"Authorization": f"Bearer {token}"}
+            )
+            if response.status_code == 429 and attempt < max_retries:
+                await asyncio.sleep(
+                    parse_retry_after(response.headers.get("Retry-After"), 2**attempt)
+                )
+                continue
+            response.raise_for_status()
+            return response.json()
+
     async def subscription_create(
         self,
         resource: str,
@@ -125,16 +355,38 @@ class Graph:
         lifecycle_url: str = CONFIG.WEBHOOK_URL + "/api/subs/lf",
         expiration_in_seconds: int = CONFIG.GRAPH_NOTIFICATION_EXPIRATION,
     ) -> Subscription:
-        subscriptions = await self.app_client.subscriptions.get()
-        for subscription in subscriptions.value:
-            if subscription.resource == resource:
-                print(f"Graph: Subscription already exists: {subscription.id}")
-                return subscription
+        await self.subscriptions.ensure_synced(self.app_client)
+        subscription = self.subscriptions.get_by_resource(resource)
+        if subscription:
+            print(f"Graph: Subscription already exists: {subscription.id}")
+            return subscription
 
+        subscription = self._new_subscription(
+            resource,
+            change_type,
+            notification_url,
+            lifecycle_url,
+            expiration_in_seconds,
+        )
+        created_subscription = await self.app_client.subscriptions.post(subscription)
+        self.subscriptions.add(created_subscription)
+        print(
+            f"Graph: Created subscription {created_subscription.id} until {created_subscription.expiration_date_time}"
+        )
+        return created_subscription
+
+    def _new_subscription(
+        self,
+        resource: str,
+        change_type: str,
+        notification_url: str = CONFIG.WEBHOOK_URL + "/api/subs/hook",
+        lifecycle_url: str = CONFIG.WEBHOOK_URL + "/api/subs/lf",
+        expiration_in_seconds: int = CONFIG.GRAPH_NOTIFICATION_EXPIRATION,
+    ) -> Subscription:
         expiration = datetime.now(tz=timezone.utc) + timedelta(
             seconds=expiration_in_seconds
         )
-        subscription = Subscription(
+        return Subscription(
             change_type=change_type,
             notification_url=notification_url,
             lifecycle_notification_url=lifecycle_url,
@@ -145,21 +397,17 @@ class Graph:
             encryption_certificate=CONFIG.NOTIFICATION_PUBLIC_KEY,
             encryption_certificate_id=CONFIG.NOTIFICATION_KEY_ID,
         )
-        created_subscription = await self.app_client.subscriptions.post(subscription)
-        print(
-            f"Graph: Created subscription {created_subscription.id} until {created_subscription.expiration_date_time}"
-        )
-        return created_subscription
 
     async def subscription_delete(self, resource: str) -> Subscription | None:
-        subscriptions = await self.app_client.subscriptions.get()
-        for subscription in subscriptions.value:
-            if subscription.resource == resource:
-                await self.app_client.subscriptions.by_subscription_id(
-                    subscription.id
-                ).delete()
-                print(f"Graph: Deleted subscription: {subscription.id}")
-                return subscription
+        await self.subscriptions.ensure_synced(self.app_client)
+        subscription = self.subscriptions.get_by_resource(resource)
+        if subscription:
+            await self.app_client.subscriptions.by_subscription_id(
+                subscription.id
+            ).delete()
+            self.subscriptions.remove(subscription.id)
+            print(f"Graph: Deleted subscription: {subscription.id}")
+            return subscription
         print(f"Graph: No matching subscription found to delete.")
 
     async def subscription_reauthorize(
@@ -167,9 +415,11 @@ class Graph:
         subscription_id: str,
         expiration_in_seconds: int = CONFIG.GRAPH_NOTIFICATION_EXPIRATION,
     ) -> Subscription | None:
-        subscription = await self.app_client.subscriptions.by_subscription_id(
-            subscription_id
-        ).get()
+        subscription = self.subscriptions.get_by_id(subscription_id)
+        if not subscription:
+            subscription = await self.app_client.subscriptions.by_subscription_id(
+                subscription_id
+            ).get()
         if subscription:
             print(f"Graph: Reauthorizing subscription: {subscription.id}")
             expiration = datetime.now(tz=timezone.utc) + timedelta(
@@ -183,10 +433,15 @@ class Graph:
                     subscription.id
                 ).patch(renew_subscription)
             )
+            subscription.expiration_date_time = (
+                updated_subscription.expiration_date_time
+            )
+            self.subscriptions.add(subscription)
             print(
                 f"Graph: Reauthorized subscription {subscription.id} "
                 f"until {updated_subscription.expiration_date_time}"
             )
+            return subscription
         else:
             print(f"Graph: No subscription found with ID: {subscription_id}")
 
@@ -199,15 +454,86 @@ class Graph:
         resource = f"/chats/{chat_id}/messages"
         return await self.subscription_delete(resource)
 
+    async def create_chat_messages_subscriptions(
+        self, chat_ids: list[str]
+    ) -> dict[str, dict]:
+        """Subscribe to the messages of many chats using $batch. Returns a result per chat."""
+        await self.subscriptions.ensure_synced(self.app_client)
+        results = {}
+        requests = []
+        for chat_id in dict.fromkeys(chat_ids):
+            resource = f"/chats/{chat_id}/messages"
+            existing = self.subscriptions.get_by_resource(resource)
+            if existing:
+                results[chat_id] = {"status": "exists", "subscription_id": existing.id}
+                continue
+            requests.append(
+                {
+                    "id": chat_id,
+                    "method": "POST",
+                    "url": "/subscriptions",
+                    "body": serialize_object(
+                        self._new_subscription(resource, "created")
+                    ),
+                }
+            )
+        responses = await self.batcher.send(requests)
+        for chat_id, response in responses.items():
+            if response["status"] == 201:
+                subscription = parse_object(response["body"], Subscription)
+                self.subscriptions.add(subscription)
+                results[chat_id] = {
+                    "status": "created",
+                    "subscription_id": subscription.id,
+                }
+            else:
+                results[chat_id] = _batch_error(response)
+        print(f"Graph: Created {len(responses)} subscriptions in bulk")
+        return results
+
+    async def delete_chat_messages_subscriptions(
+        self, chat_ids: list[str]
+    ) -> dict[str, dict]:
+        """Delete the message subscriptions of many chats using $batch."""
+        await self.subscriptions.ensure_synced(self.app_client)
+        results = {}
+        requests = []
+        subscription_ids = {}
+        for chat_id in dict.fromkeys(chat_ids):
+            existing = self.subscriptions.get_by_resource(f"/chats/{chat_id}/messages")
+            if not existing:
+                results[chat_id] = {"status": "not_found"}
+                continue
+            subscription_ids[chat_id] = existing.id
+            requests.append(
+                {
+                    "id": chat_id,
+                    "method": "DELETE",
+                    "url": f"/subscriptions/{existing.id}",
+                }
+            )
+        responses = await self.batcher.send(requests)
+        for chat_id, response in responses.items():
+            if response["status"] in (204, 404):
+                self.subscriptions.remove(subscription_ids[chat_id])
+                results[chat_id] = {
+                    "status": "deleted",
+                    "subscription_id": subscription_ids[chat_id],
+                }
+            else:
+                results[chat_id] = _batch_error(response)
+        print(f"Graph: Deleted {len(responses)} subscriptions in bulk")
+        return results
+
     async def list_chat_messages_subscription(self, chat_id: str) -> None:
         resource = f"/chats/{chat_id}/messages"
-        subscriptions = await self.app_client.subscriptions.get()
-        for subscription in subscriptions.value:
-            if subscription.resource == resource:
-                print(
-                    f"Graph: Found subscription: {subscription.id} until {subscription.expiration_date_time}"
-                )
-                return subscription
+        await self.subscriptions.ensure_synced(self.app_client)
+        subscription = self.subscriptions.get_by_resource(resource)
+        if subscription:
+            print(
+                f"Graph: Found subscription: {subscription.id} until {subscription.expiration_date_time}"
+            )
+            return subscription
         print(f"Graph: No matching subscription found.")
 
     async def add_bot_to_chat(self, chat_id: str) -> None:
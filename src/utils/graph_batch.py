@@ -0,0 +1,133 @@
+"""
+Helper to send many Graph requests through JSON batching ($batch), 20 requests per
+batch, with bounded concurrency and retries for throttled (429) requests.
+
+https://learn.microsoft.com/en-us/graph/json-batching
+https://learn.microsoft.com/en-us/graph/throttling
+"""
+
+import asyncio
+from typing import Awaitable, Callable
+
+import httpx
+
+from config import DefaultConfig
+from utils.rate_limit import parse_retry_after
+
+CONFIG = DefaultConfig()
+
+MAX_BATCH_SIZE = 20
+
+
+class GraphBatcher:
+    """Sends lists of Graph requests as $batch requests."""
+
+    def __init__(
+        self,
+        http_client: httpx.AsyncClient,
+        get_token: Callable[[], Awaitable[str]],
+        endpoint: str = CONFIG.GRAPH_ENDPOINT,
+        concurrency: int = CONFIG.GRAPH_BATCH_CONCURRENCY,
+        max_retries: int = CONFIG.GRAPH_BATCH_MAX_RETRIES,
+    ):
+        self._http_client = http_client
+        self._get_token = get_token
+        self._url = f"{endpoint.rstrip('/')}/$batch"
+        self._slots = asyncio.Semaphore(concurrency)
+        self._max_retries = max_retries
+        self.batches = 0
+        self.throttled = 0
+
+    async def send(self, requests: list[dict]) -> dict[str, dict]:
+        """
+        Send the requests and return the responses indexed by request id.
+
+        Each request is a dict with "id", "method", "url" (relative to the Graph version,
+        e.g. "/subscriptions/{id}") and optionally "body" and "headers". Each response
+        is a dict with "status", "headers" and "body".
+        """
+        responses: dict[str, dict] = {}
+        pending = list(requests)
+        for attempt in range(self._max_retries + 1):
+            chunks = [
+                pending[i : i + MAX_BATCH_SIZE]
+                for i in range(0, len(pending), MAX_BATCH_SIZE)
+            ]
+            results = await asyncio.gather(*(self._send_batch(c) for c in chunks))
+            retry_after = 0
+            pending = []
+            for chunk, chunk_responses in zip(chunks, results):
+                by_id = {request["id"]: request for request in chunk}
+                for response in chunk_responses:
+                    responses[response["id"]] = response
+                    if response["status"] == 429 and attempt < self._max_retries:
+                        self.throttled += 1
+                        pending.append(by_id[response["id"]])
+                        retry_after = max(retry_after, _retry_after(response))
+            if not pending:
+                break
+            print(
+                f"Graph: {len(pending)} batched requests throttled, retrying in {retry_after}s"
+            )
+            await asyncio.sleep(retry_after)
+        return responses
+
+    async def _send_batch(self, requests: list[dict]) -> list[dict]:
+        body = {
+            "requests": [
+                {
+                    "id": request["id"],
+                    "method": request["method"],
+                    "url": request["url"],
+                    **(
+                        {
+                            "body": request["body"],
+                            "headers": {
+                                "Content-Type": "application/json",
+                                **request.get("headers", {}),
+                            },
+                        }
+                        if "body" in request
+                        else {"headers": request.get("headers", {})}
+                    ),
+                }
+                for request in requests
+            ]
+        }
+        async with self._slots:
+            for attempt in range(self._max_retries + 1):
+                token = await self._get_token()
+                response = await self._http_client.post(
+                    self._url,
+                    json=body,
+                    headers={"Authorization": f"Bearer {token}"},
+                )
+                self.batches += 1
+                if response.status_code == 429 and attempt < self._max_retries:
+                    # The whole batch was throttled
+                    self.throttled += 1
+                    await asyncio.sleep(
+                        parse_retry_after(
+                            response.headers.get("Retry-After"), 2**attempt
+                        )
+                    )
+                    continue
+                if response.status_code != 200:
+                    return [
+                        {
+                            "id": request["id"],
+                            "status": response.status_code,
+                            "headers": dict(response.headers),
+                            "body": response.text,
+                        }
+                        for request in requests
+                    ]
+                return response.json().get("responses", [])
+
+    def stats(self) -> dict:
+        return {"batches": self.batches, "throttled": self.throttled}
+
+
+def _retry_after(response: dict) -> float:
+    headers = {k.lower(): v for k, v in (response.get("headers") or {}).items()}
+    return parse_retry_after(headers.get("retry-after"), 1)
@@ -0,0 +1,90 @@
+"""
+Tracking of long-running background jobs (broadcasts, bulk sends) and their progress.
+"""
+
+import time
+import uuid
+from collections import OrderedDict
+
+from utils import stats
+
+MAX_ERRORS = 100
+
+
+class Job:
+    """Progress and failures of a background job."""
+
+    def __init__(self, kind: str, total: int | None = None):
+        self.id = str(uuid.uuid4())
+        self.kind = kind
+        self.status = "running"
+        self.total = total
+        self.succeeded = 0
+        self.failed = 0
+        self.retried = 0
+        self.errors: list[dict] = []
+        self.created_at = time.time()
+        self.finished_at: float | None = None
+
+    def success(self) -> None:
+        self.succeeded += 1
+
+    def failure(self, target: str, error: Exception | str) -> None:
+        self.failed += 1
+        if len(self.errors) < MAX_ERRORS:
+            self.errors.append({"target": target, "error": str(error)})
+
+    def finish(self, status: str = "completed") -> None:
+        self.status = status
+        self.finished_at = time.time()
+
+    def to_dict(self) -> dict:
+        end = self.finished_at or time.time()
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "total": self.total,
+            "succeeded": self.succeeded,
+            "failed": self.failed,
+            "retried": self.retried,
+            "elapsed": end - self.created_at,
+            "errors": self.errors,
+        }
+
+
+class JobRegistry:
+    """The most recent jobs, indexed by id."""
+
+    def __init__(self, max_jobs: int = 100):
+        self._max_jobs = max_jobs
+        self._jobs: OrderedDict[str, Job] = OrderedDict()
+
+    def create(self, kind: str, total: int | None = None) -> Job:
+        job = Job(kind, total)
+        self._jobs[job.id] = job
+        while len(self._jobs) > self._max_jobs:
+            self._jobs.popitem(last=False)
+        return job
+
+    def get(self, job_id: str) -> Job | None:
+        return self._jobs.get(job_id)
+
+    def stats(self) -> dict:
+        running = [job for job in self._jobs.values() if job.status == "running"]
+        return {
+            "jobs": len(self._jobs),
+            "running": [
+                {
+                    "id": job.id,
+                    "kind": job.kind,
+                    "succeeded": job.succeeded,
+                    "failed": job.failed,
+                }
+                for job in running
+            ],
+        }
+
+
+JOBS = JobRegistry()
+stats.register("jobs", JOBS.stats)
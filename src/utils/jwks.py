@@ -0,0 +1,147 @@
+"""
+Process-wide cache of JSON Web Key Sets (JWKS) used to verify JWT signatures.
+
+Signing keys are indexed by their `kid` and refreshed when the TTL expires or when a
+token references a `kid` that is not in the cache. Concurrent callers share a single
+download of the key set. Downloads are blocking, so async code should pre-warm the cache
+and keep it fresh with `start()`, and call `get_signing_key` from a thread on a miss.
+"""
+
+import asyncio
+import threading
+import time
+from typing import Callable
+
+import jwt
+import requests
+
+from config import DefaultConfig
+
+CONFIG = DefaultConfig()
+
+# A key source returns the raw JWKS document: {"keys": [{...}, ...]}
+KeySource = Callable[[], dict]
+
+
+def url_key_source(url: str, timeout: float = 10) -> KeySource:
+    """Create a key source that downloads the JWKS document from a URL."""
+
+    def fetch() -> dict:
+        response = requests.get(url, timeout=timeout)
+        response.raise_for_status()
+        return response.json()
+
+    return fetch
+
+
+def openid_key_source(metadata_url: str, timeout: float = 10) -> KeySource:
+    """Create a key source that follows the jwks_uri of an OpenID metadata document."""
+
+    def fetch() -> dict:
+        response = requests.get(metadata_url, timeout=timeout)
+        response.raise_for_status()
+        return url_key_source(response.json()["jwks_uri"], timeout)()
+
+    return fetch
+
+
+class JwksCache:
+    """A kid-indexed cache of signing keys with TTL-based refresh."""
+
+    def __init__(
+        self,
+        source: KeySource,
+        ttl: int = CONFIG.JWKS_CACHE_TTL,
+        min_refresh_interval: int = CONFIG.JWKS_MIN_REFRESH_INTERVAL,
+    ):
+        self._source = source
+        self._ttl = ttl
+        self._min_refresh_interval = min_refresh_interval
+        self._keys: dict[str, jwt.PyJWK] = {}
+        self._fetched_at = 0.0
+        self._lock = threading.Lock()
+        self._task: asyncio.Task | None = None
+        self.refreshes = 0
+        self.failures = 0
+
+    def get_signing_key(self, kid: str) -> jwt.PyJWK:
+        """Return the signing key with the given kid, refreshing the key set if needed."""
+        if self._is_expired():
+            self._refresh(force=False)
+        key = self._keys.get(kid)
+        if key is None:
+            # The key set may have been rotated since the last download
+            self._refresh(force=True)
+            key = self._keys.get(kid)
+        if key is None:
+            raise jwt.PyJWKClientError(
+                f'Unable to find a signing key that matches: "{kid}"'
+            )
+        return key
+
+    def get_signing_key_from_jwt(self, token: str) -> jwt.PyJWK:
+        """Return the signing key referenced by the kid in the token header."""
+        header = jwt.get_unverified_header(token)
+        return self.get_signing_key(header.get("kid"))
+
+    def refresh(self) -> None:
+        """Download the key set now, e.g. to pre-warm the cache."""
+        with self._lock:
+            self._load()
+
+    def start(self, refresh_interval: float) -> None:
+        """Download the key set now and then every `refresh_interval` seconds."""
+        self._task = asyncio.create_task(self._keep_fresh(refresh_interval))
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _keep_fresh(self, refresh_interval: float) -> None:
+        while True:
+            try:
+                await asyncio.to_thread(self.refresh)
+            except Exception as e:
+                self.failures += 1
+                print(f"JWKS: Error refreshing the signing keys: {e}")
+            await asyncio.sleep(refresh_interval)
+
+    def stats(self) -> dict:
+        return {
+            "keys": len(self._keys),
+            "refreshes": self.refreshes,
+            "failures": self.failures,
+        }
+
+    def clear(self) -> None:
+        with self._lock:
+            self._keys = {}
+            self._fetched_at = 0.0
+
+    def _is_expired(self) -> bool:
+        return time.monotonic() - self._fetched_at > self._ttl
+
+    def _refresh(self, force: bool) -> None:
+        fetched_at = self._fetched_at
+        with self._lock:
+            # Another caller refreshed the keys while we were waiting for the lock
+            if self._fetched_at != fetched_at:
+                return
+            if not force and not self._is_expired():
+                return
+            if (
+                force
+                and self._keys
+                and time.monotonic() - self._fetched_at < self._min_refresh_interval
+            ):
+                return
+            self._load()
+
+    def _load(self) -> None:
+        jwk_set = jwt.PyJWKSet.from_dict(self._source())
+        self._keys = {key.key_id: key for key in jwk_set.keys if key.key_id}
+        self._fetched_at = time.monotonic()
+        self.refreshes += 1
+        print(f"JWKS: Loaded {len(self._keys)} signing keys")
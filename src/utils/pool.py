@@ -0,0 +1,73 @@
+"""
+Worker pool used to run CPU-bound work (decryption, parsing) off the event loop.
+"""
+
+import asyncio
+import functools
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable
+
+from config import DefaultConfig
+
+CONFIG = DefaultConfig()
+
+
+class WorkerPool:
+    """
+    Runs functions in a thread or process pool, or inline on the event loop.
+
+    The number of submitted jobs that haven't finished yet is capped by `max_pending`.
+    Callers wait for a free slot once the cap is reached.
+    """
+
+    MODES = ("inline", "thread", "process")
+
+    def __init__(self, mode: str, max_workers: int | None, max_pending: int):
+        if mode not in self.MODES:
+            raise ValueError(f"Invalid worker pool mode: {mode}")
+        self.mode = mode
+        self.max_workers = max_workers or os.cpu_count()
+        self.max_pending = max_pending
+        self.pending = 0
+        self._executor: Executor | None = None
+        self._slots: asyncio.Semaphore | None = None
+
+    def start(self) -> None:
+        if self.mode == "thread":
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_workers, thread_name_prefix="notifications"
+            )
+        elif self.mode == "process":
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+        self._slots = asyncio.Semaphore(self.max_pending)
+        print(f"Pool: Started {self.mode} worker pool with {self.max_workers} workers")
+
+    def shutdown(self) -> None:
+        if self._executor:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+    async def run(self, func: Callable, *args, **kwargs) -> Any:
+        """Run the function in the pool and return its result."""
+        if self._slots is None:
+            self.start()
+        async with self._slots:
+            self.pending += 1
+            try:
+                if self._executor is None:
+                    return func(*args, **kwargs)
+                loop = asyncio.get_running_loop()
+                return await loop.run_in_executor(
+                    self._executor, functools.partial(func, *args, **kwargs)
+                )
+            finally:
+                self.pending -= 1
+
+    def stats(self) -> dict:
+        return {
+            "mode": self.mode,
+            "workers": self.max_workers,
+            "pending": self.pending,
+            "max_pending": self.max_pending,
+        }
@@ -0,0 +1,70 @@
+"""
+Rate limiting and retry helpers for calls to throttled services (Bot Connector, Graph).
+"""
+
+import asyncio
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+
+class TokenBucket:
+    """Allows `rate` operations per second on average with bursts of up to `burst`."""
+
+    def __init__(self, rate: float, burst: int):
+        self._rate = rate
+        self._burst = burst
+        self._tokens = float(burst)
+        self._updated_at = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(
+                    self._burst, self._tokens + (now - self._updated_at) * self._rate
+                )
+                self._updated_at = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self._rate)
+
+    def pause(self, seconds: float) -> None:
+        """
+        Stop handing out tokens for a while, e.g. after a 429 response. Concurrent
+        pauses don't add up, the longest one wins.
+        """
+        self._tokens = min(self._tokens, -seconds * self._rate)
+
+
+def retry_after(error: Exception) -> float | None:
+    """
+    Return the seconds to wait if the error is a throttling (429) response from
+    the Bot Connector, or None otherwise.
+    """
+    response = getattr(error, "response", None)
+    if getattr(response, "status_code", None) != 429:
+        return None
+    return parse_retry_after(response.headers.get("Retry-After"), 1.0)
+
+
+def parse_retry_after(value: str | None, default: float) -> float:
+    """
+    Return the seconds to wait from a Retry-After header, which is either a number of
+    seconds or an HTTP-date, or the default if it's missing or invalid.
+    """
+    if value is None:
+        return default
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return default
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(tz=timezone.utc)).total_seconds())
@@ -0,0 +1,171 @@
+"""
+Background renewal of Graph subscriptions before they expire.
+
+Subscriptions are kept in a min-heap ordered by their renewal time (expiration minus a
+margin and a random jitter). Due subscriptions are renewed together through $batch.
+Only the latest entry of every subscription is current, older entries are skipped when
+they come up and the heap is rebuilt when they pile up.
+"""
+
+import asyncio
+import heapq
+import random
+from datetime import datetime, timedelta, timezone
+
+from msgraph.generated.models.subscription import Subscription
+
+from config import DefaultConfig
+
+CONFIG = DefaultConfig()
+
+
+def _as_datetime(value) -> datetime:
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value
+
+
+class RenewalScheduler:
+    """Renews the subscriptions of a Graph instance ahead of their expiration."""
+
+    def __init__(
+        self,
+        graph,
+        renew_ahead: int = CONFIG.SUBSCRIPTION_RENEW_AHEAD,
+        jitter: int = CONFIG.SUBSCRIPTION_RENEW_JITTER,
+        expiration_in_seconds: int = CONFIG.GRAPH_NOTIFICATION_EXPIRATION,
+    ):
+        self._graph = graph
+        self._renew_ahead = renew_ahead
+        self._jitter = jitter
+        self._expiration_in_seconds = expiration_in_seconds
+        # (renew at timestamp, subscription id, expiration timestamp)
+        self._heap: list[tuple[float, str, float]] = []
+        # The current (renew at, expiration) of every scheduled subscription
+        self._scheduled: dict[str, tuple[float, float]] = {}
+        self._wakeup = asyncio.Event()
+        self._task: asyncio.Task | None = None
+        self.renewed = 0
+        self.failed = 0
+        graph.subscriptions.on_add(self.schedule)
+
+    def schedule(self, subscription: Subscription) -> None:
+        if not subscription.expiration_date_time:
+            return
+        expires_at = _as_datetime(subscription.expiration_date_time).timestamp()
+        current = self._scheduled.get(subscription.id)
+        if current and current[1] == expires_at:
+            # Already scheduled, e.g. the registry was synced again
+            return
+        renew_at = expires_at - self._renew_ahead - random.uniform(0, self._jitter)
+        self._push(subscription.id, renew_at, expires_at)
+
+    def _push(self, subscription_id: str, renew_at: float, expires_at: float) -> None:
+        self._scheduled[subscription_id] = (renew_at, expires_at)
+        heapq.heappush(self._heap, (renew_at, subscription_id, expires_at))
+        if len(self._heap) > 2 * len(self._scheduled) + 16:
+            self._heap = [(r, i, e) for i, (r, e) in self._scheduled.items()]
+            heapq.heapify(self._heap)
+        if renew_at <= self._heap[0][0]:
+            self._wakeup.set()
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run(), name="subscription-renewal")
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            self._wakeup.clear()
+            delay = self._heap[0][0] - _now() if self._heap else 3600
+            if delay > 0:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), delay)
+                    continue
+                except asyncio.TimeoutError:
+                    pass
+            try:
+                await self.renew_due()
+            except Exception as e:
+                print(f"Graph: Error renewing subscriptions: {e}")
+                await asyncio.sleep(10)
+
+    async def renew_due(self) -> None:
+        """Renew every subscription whose renewal time has passed."""
+        due: dict[str, Subscription] = {}
+        now = _now()
+        while self._heap and self._heap[0][0] <= now:
+            renew_at, subscription_id, expires_at = heapq.heappop(self._heap)
+            if self._scheduled.get(subscription_id) != (renew_at, expires_at):
+                # Replaced by a newer entry
+                continue
+            del self._scheduled[subscription_id]
+            subscription = self._graph.subscriptions.get_by_id(subscription_id)
+            # Skip entries for deleted subscriptions or that were rescheduled since
+            if (
+                subscription is None
+                or _as_datetime(subscription.expiration_date_time).timestamp()
+                != expires_at
+            ):
+                continue
+            due[subscription.id] = subscription
+        if not due:
+            return
+
+        expiration = (
+            datetime.now(tz=timezone.utc)
+            + timedelta(seconds=self._expiration_in_seconds)
+        ).isoformat()
+        responses = await self._graph.batcher.send(
+            [
+                {
+                    "id": str(i),
+                    "method": "PATCH",
+                    "url": f"/subscriptions/{subscription.id}",
+                    "body": {"expirationDateTime": expiration},
+                }
+                for i, subscription in enumerate(due.values())
+            ]
+        )
+        renewed = 0
+        for i, subscription in enumerate(due.values()):
+            response = responses.get(str(i), {})
+            status = response.get("status")
+            if status == 200:
+                renewed += 1
+                subscription.expiration_date_time = _as_datetime(
+                    response["body"]["expirationDateTime"]
+                )
+                self._graph.subscriptions.add(subscription)
+            elif status == 404:
+                self.failed += 1
+                print(f"Graph: Subscription {subscription.id} no longer exists")
+                self._graph.subscriptions.remove(subscription.id)
+            else:
+                self.failed += 1
+                print(
+                    f"Graph: Failed to renew subscription {subscription.id}: {status}"
+                )
+                # Try again later, it may not have expired yet
+                expires_at = _as_datetime(subscription.expiration_date_time).timestamp()
+                self._push(subscription.id, _now() + 30, expires_at)
+        self.renewed += renewed
+        print(f"Graph: Renewed {renewed} of {len(due)} due subscriptions")
+
+    def stats(self) -> dict:
+        return {
+            "scheduled": len(self._scheduled),
+            "next_renewal_in": self._heap[0][0] - _now() if self._heap else None,
+            "renewed": self.renewed,
+            "failed": self.failed,
+        }
+
+
+def _now() -> float:
+    return datetime.now(tz=timezone.utc).timestamp()
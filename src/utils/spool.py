@@ -0,0 +1,222 @@
+"""
+Append-only, segment-based local spool that keeps accepted notifications on disk until
+they have been processed, so they can be replayed after a restart.
+
+Records are JSON lines with a sequence number. The consumer acknowledges records as it
+processes them and the spool persists the highest sequence number below which every
+record has been acknowledged. Segments whose records are all acknowledged are deleted.
+"""
+
+import asyncio
+import json
+import os
+from typing import Any, AsyncIterator, Iterator
+
+SEGMENT_PREFIX = "segment-"
+SEGMENT_SUFFIX = ".log"
+OFFSET_FILE = "offset"
+
+
+class Spool:
+    """
+    A durable FIFO of JSON records with batched fsync and a consumer offset.
+
+    Appends are fsync'ed in batches, and the offset is persisted and consumed segments
+    deleted in batches too. All the disk I/O after the construction runs in the default
+    executor, so the event loop doesn't wait on fsync.
+    """
+
+    def __init__(self, directory: str, segment_size: int, fsync_interval: float):
+        self._directory = directory
+        self._segment_size = segment_size
+        self._fsync_interval = fsync_interval
+        os.makedirs(directory, exist_ok=True)
+
+        self.committed = self._read_offset()
+        # First sequence number of every segment on disk, oldest first
+        self._segments = sorted(
+            int(name[len(SEGMENT_PREFIX) : -len(SEGMENT_SUFFIX)])
+            for name in os.listdir(directory)
+            if name.startswith(SEGMENT_PREFIX) and name.endswith(SEGMENT_SUFFIX)
+        )
+        self._next_seq = max(self.committed, self._last_seq_on_disk()) + 1
+        self._acked: set[int] = set()
+        self._offset_written = self.committed
+        self._file = None
+        self._file_size = 0
+        # Held while the current segment is fsync'ed or replaced
+        self._file_lock = asyncio.Lock()
+        self._flush_future: asyncio.Future | None = None
+        # Keep a reference to the background flush and commit so they aren't
+        # garbage collected while appenders wait on them
+        self._flush_task: asyncio.Task | None = None
+        self._commit_task: asyncio.Task | None = None
+        self.appended = 0
+        self.fsyncs = 0
+
+    async def replay(self) -> AsyncIterator[tuple[int, Any]]:
+        """Yield the records that were appended but not acknowledged."""
+        for first_seq in list(self._segments):
+            records = await asyncio.to_thread(self._read_segment, first_seq)
+            for seq, item in records:
+                if seq > self.committed:
+                    yield seq, item
+
+    async def append(self, item: Any) -> int:
+        """Append a record and wait until it has been fsync'ed to disk."""
+        if self._file is None or self._file_size >= self._segment_size:
+            await self._rotate()
+        seq = self._write(item)
+        if self._flush_future is None:
+            self._flush_future = asyncio.get_running_loop().create_future()
+            self._flush_task = asyncio.create_task(self._flush())
+        await asyncio.shield(self._flush_future)
+        return seq
+
+    def ack(self, seq: int) -> None:
+        """Mark a record as processed."""
+        self._acked.add(seq)
+        committed = self.committed
+        while committed + 1 in self._acked:
+            committed += 1
+            self._acked.remove(committed)
+        if committed != self.committed:
+            self.committed = committed
+            if self._commit_task is None:
+                self._commit_task = asyncio.create_task(self._commit())
+
+    async def close(self) -> None:
+        if self._commit_task:
+            await self._commit_task
+        async with self._file_lock:
+            if self._file:
+                await asyncio.to_thread(self._close_file, self._file)
+                self._file = None
+        if self._offset_written != self.committed:
+            await asyncio.to_thread(self._write_offset, self.committed)
+
+    def stats(self) -> dict:
+        return {
+            "segments": len(self._segments),
+            "next_seq": self._next_seq,
+            "committed": self.committed,
+            "pending_acks": len(self._acked),
+            "appended": self.appended,
+            "fsyncs": self.fsyncs,
+        }
+
+    def _write(self, item: Any) -> int:
+        seq = self._next_seq
+        self._next_seq += 1
+        line = json.dumps({"seq": seq, "data": item}, separators=(",", ":")) + "\n"
+        data = line.encode("utf-8")
+        self._file.write(data)
+        self._file_size += len(data)
+        self.appended += 1
+        return seq
+
+    async def _flush(self) -> None:
+        await asyncio.sleep(self._fsync_interval)
+        async with self._file_lock:
+            future, self._flush_future = self._flush_future, None
+            try:
+                # Closed or rotated segments were fsync'ed when they were closed
+                if self._file:
+                    self._file.flush()
+                    # Duplicate the descriptor so closing the file can't interrupt it
+                    fd = os.dup(self._file.fileno())
+                    try:
+                        await asyncio.to_thread(os.fsync, fd)
+                    finally:
+                        os.close(fd)
+                    self.fsyncs += 1
+                future.set_result(None)
+            except Exception as e:
+                future.set_exception(e)
+
+    async def _rotate(self) -> None:
+        async with self._file_lock:
+            # Another append may have rotated while this one was waiting
+            if self._file is not None and self._file_size < self._segment_size:
+                return
+            # No record is written until the new segment is open
+            self._file = await asyncio.to_thread(
+                self._open_segment, self._file, self._next_seq
+            )
+            self._segments.append(self._next_seq)
+            self._file_size = 0
+
+    def _open_segment(self, previous, first_seq: int):
+        if previous:
+            self._close_file(previous)
+        return open(self._segment_path(first_seq), "ab")
+
+    @staticmethod
+    def _close_file(segment) -> None:
+        segment.flush()
+        os.fsync(segment.fileno())
+        segment.close()
+
+    async def _commit(self) -> None:
+        """Persist the committed offset and delete the fully acknowledged segments."""
+        try:
+            while self._offset_written != self.committed:
+                # Batch the acknowledgements of the interval
+                await asyncio.sleep(self._fsync_interval)
+                # A segment is consumed when the next one starts after the committed offset
+                consumed = []
+                while (
+                    len(self._segments) > 1 and self._segments[1] <= self.committed + 1
+                ):
+                    consumed.append(self._segments.pop(0))
+                await asyncio.to_thread(self._write_offset, self.committed, consumed)
+        finally:
+            self._commit_task = None
+
+    def _read_segment(self, first_seq: int) -> list[tuple[int, Any]]:
+        try:
+            with open(self._segment_path(first_seq), "rb") as segment:
+                return list(self._parse_segment(segment))
+        except FileNotFoundError:
+            # Deleted once all its records were acknowledged
+            return []
+
+    @staticmethod
+    def _parse_segment(segment) -> Iterator[tuple[int, Any]]:
+        for line in segment:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # Partially written record from a crash
+                continue
+            yield record["seq"], record["data"]
+
+    def _last_seq_on_disk(self) -> int:
+        last_seq = 0
+        for first_seq in self._segments:
+            for seq, _ in self._read_segment(first_seq):
+                last_seq = max(last_seq, seq)
+        return last_seq
+
+    def _segment_path(self, first_seq: int) -> str:
+        return os.path.join(
+            self._directory, f"{SEGMENT_PREFIX}{first_seq:012d}{SEGMENT_SUFFIX}"
+        )
+
+    def _read_offset(self) -> int:
+        try:
+            with open(os.path.join(self._directory, OFFSET_FILE)) as offset_file:
+                return int(offset_file.read().strip() or 0)
+        except FileNotFoundError:
+            return 0
+
+    def _write_offset(self, committed: int, consumed: list[int] | None = None) -> None:
+        path = os.path.join(self._directory, OFFSET_FILE)
+        with open(path + ".tmp", "w") as offset_file:
+            offset_file.write(str(committed))
+            offset_file.flush()
+            os.fsync(offset_file.fileno())
+        os.replace(path + ".tmp", path)
+        self._offset_written = committed
+        for first_seq in consumed or ():
+            os.remove(self._segment_path(first_seq))
@@ -0,0 +1,16 @@
+"""
+Registry of runtime counters exposed by the /api/stats endpoint.
+"""
+
+from typing import Callable
+
+_PROVIDERS: dict[str, Callable[[], dict]] = {}
+
+
+def register(name: str, provider: Callable[[], dict]) -> None:
+    """Register a callable that returns a JSON-serializable dict of counters."""
+    _PROVIDERS[name] = provider
+
+
+def collect() -> dict:
+    return {name: provider() for name, provider in _PROVIDERS.items()}
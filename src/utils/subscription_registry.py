@@ -0,0 +1,127 @@
+"""
+Local index of the Graph subscriptions owned by the app, so lookups by resource or by
+subscription id don't need a round-trip to Graph.
+"""
+
+import asyncio
+import time
+from typing import Callable
+
+from msgraph import GraphServiceClient
+from msgraph.generated.models.subscription import Subscription
+
+from config import DefaultConfig
+
+CONFIG = DefaultConfig()
+
+
+class SubscriptionRegistry:
+    """Subscriptions indexed by id and by resource."""
+
+    def __init__(self, sync_interval: int = CONFIG.SUBSCRIPTION_SYNC_INTERVAL):
+        self._sync_interval = sync_interval
+        self._by_id: dict[str, Subscription] = {}
+        self._by_resource: dict[str, Subscription] = {}
+        self._lock = asyncio.Lock()
+        self._listeners: list[Callable[[Subscription], None]] = []
+        self._sync_task: asyncio.Task | None = None
+        # Changes made while a sync is listing the subscriptions, which win over it
+        self._syncing = False
+        self._added_during_sync: set[str] = set()
+        self._removed_during_sync: set[str] = set()
+        self.synced_at = 0.0
+
+    def on_add(self, listener: Callable[[Subscription], None]) -> None:
+        """Call the listener whenever a subscription is added or updated."""
+        self._listeners.append(listener)
+
+    def get_by_id(self, subscription_id: str) -> Subscription | None:
+        return self._by_id.get(subscription_id)
+
+    def get_by_resource(self, resource: str) -> Subscription | None:
+        return self._by_resource.get(resource)
+
+    def all(self) -> list[Subscription]:
+        return list(self._by_id.values())
+
+    def add(self, subscription: Subscription) -> None:
+        self.remove(subscription.id)
+        if self._syncing:
+            self._added_during_sync.add(subscription.id)
+            self._removed_during_sync.discard(subscription.id)
+        self._by_id[subscription.id] = subscription
+        self._by_resource[subscription.resource] = subscription
+        for listener in self._listeners:
+            listener(subscription)
+
+    def remove(self, subscription_id: str) -> Subscription | None:
+        if self._syncing:
+            self._removed_during_sync.add(subscription_id)
+            self._added_during_sync.discard(subscription_id)
+        subscription = self._by_id.pop(subscription_id, None)
+        if (
+            subscription
+            and self._by_resource.get(subscription.resource) is subscription
+        ):
+            del self._by_resource[subscription.resource]
+        return subscription
+
+    async def ensure_synced(self, app_client: GraphServiceClient) -> None:
+        """
+        Wait for the first sync, and refresh a stale registry in the background so the
+        request doesn't wait for every page of the subscriptions list.
+        """
+        if not self.synced_at:
+            await self.sync(app_client)
+        elif time.monotonic() - self.synced_at > self._sync_interval:
+            if self._sync_task is None or self._sync_task.done():
+                self._sync_task = asyncio.create_task(
+                    self._background_sync(app_client), name="subscriptions-sync"
+                )
+
+    async def _background_sync(self, app_client: GraphServiceClient) -> None:
+        try:
+            await self.sync(app_client)
+        except Exception as e:
+            print(f"Graph: Error syncing subscriptions: {e}")
+
+    async def sync(self, app_client: GraphServiceClient) -> None:
+        """
+        Merge every page of the subscriptions list into the registry. Subscriptions
+        added or removed locally while the list is downloaded are kept as they are.
+        """
+        synced_at = self.synced_at
+        async with self._lock:
+            if self.synced_at != synced_at:
+                return
+            self._syncing = True
+            self._added_during_sync.clear()
+            self._removed_during_sync.clear()
+            try:
+                subscriptions = []
+                page = await app_client.subscriptions.get()
+                while page:
+                    subscriptions.extend(page.value or [])
+                    if not page.odata_next_link:
+                        break
+                    page = await app_client.subscriptions.with_url(
+                        page.odata_next_link
+                    ).get()
+            finally:
+                self._syncing = False
+            added, removed = self._added_during_sync, self._removed_during_sync
+            listed = {s.id: s for s in subscriptions if s.id not in removed}
+            for subscription_id in list(self._by_id):
+                if subscription_id not in listed and subscription_id not in added:
+                    self.remove(subscription_id)
+            for subscription in listed.values():
+                if subscription.id not in added:
+                    self.add(subscription)
+            self.synced_at = time.monotonic()
+            print(f"Graph: Synced {len(subscriptions)} subscriptions")
+
+    def stats(self) -> dict:
+        return {
+            "subscriptions": len(self._by_id),
+            "synced_ago": time.monotonic() - self.synced_at if self.synced_at else None,
+        }
@@ -0,0 +1,210 @@
+"""
+Background refresh of the app-only access tokens used for Graph and the Bot Connector,
+so requests never wait for a token round-trip to Entra ID.
+"""
+
+import asyncio
+import time
+
+import aiohttp
+from azure.core.credentials import AccessToken
+from botframework.connector.auth import MicrosoftAppCredentials
+
+from config import DefaultConfig
+from utils import stats
+
+CONFIG = DefaultConfig()
+
+
+class ManagedToken:
+    """An app-only token acquired with the client credentials grant."""
+
+    def __init__(
+        self,
+        name: str,
+        tenant: str,
+        client_id: str,
+        client_secret: str,
+        scope: str,
+        authority: str = CONFIG.TOKEN_AUTHORITY,
+    ):
+        self.name = name
+        self.token_endpoint = f"{authority.rstrip('/')}/{tenant}/oauth2/v2.0/token"
+        self.scope = scope
+        self._client_id = client_id
+        self._client_secret = client_secret
+        self._lock = asyncio.Lock()
+        self._session: aiohttp.ClientSession | None = None
+        self.access_token: str | None = None
+        self.expires_at = 0.0
+        self.acquired_at = 0.0
+        self.refreshes = 0
+        self.failures = 0
+        self.last_refresh_latency = 0.0
+
+    def is_valid(self, margin: float = 0) -> bool:
+        return self.access_token is not None and time.time() < self.expires_at - margin
+
+    async def get(self) -> str:
+        """Return the current token, acquiring a new one if it has expired."""
+        if not self.is_valid():
+            await self.refresh()
+        return self.access_token
+
+    async def refresh(self) -> None:
+        acquired_at = self.acquired_at
+        async with self._lock:
+            # Another caller got a new token while we were waiting
+            if self.acquired_at != acquired_at and self.is_valid():
+                return
+            if self._session is None:
+                self._session = aiohttp.ClientSession()
+            start = time.monotonic()
+            try:
+                async with self._session.post(
+                    self.token_endpoint,
+                    data={
+                        "grant_type": "client_credentials",
+                        "client_id": self._client_id,
+                        "client_secret": self._client_secret,
+                        "scope": self.scope,
+                    },
+                ) as response:
+                    body = await response.json()
+                    if response.status != 200 or "access_token" not in body:
+                        raise PermissionError(
+                            f"Failed to get {self.name} token: {body.get('error_description', body)}"
+                        )
+            except Exception:
+                self.failures += 1
+                raise
+            now = time.time()
+            self.access_token = body["access_token"]
+            self.expires_at = now + int(body.get("expires_in", 3599))
+            self.acquired_at = now
+            self.refreshes += 1
+            self.last_refresh_latency = time.monotonic() - start
+
+    async def close(self) -> None:
+        if self._session:
+            await self._session.close()
+            self._session = None
+
+    def stats(self) -> dict:
+        now = time.time()
+        return {
+            "valid": self.is_valid(),
+            "age": now - self.acquired_at if self.acquired_at else None,
+            "expires_in": self.expires_at - now if self.access_token else None,
+            "refreshes": self.refreshes,
+            "failures": self.failures,
+            "last_refresh_latency": self.last_refresh_latency,
+        }
+
+
+class ManagedTokenCredential:
+    """An async azure-identity style credential that serves a ManagedToken."""
+
+    def __init__(self, token: ManagedToken):
+        self._token = token
+
+    async def get_token(self, *scopes, **kwargs) -> AccessToken:
+        access_token = await self._token.get()
+        return AccessToken(access_token, int(self._token.expires_at))
+
+    async def close(self) -> None:
+        pass
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        pass
+
+
+class ManagedAppCredentials(MicrosoftAppCredentials):
+    """Bot Framework credentials that use the managed token while it is valid."""
+
+    def __init__(self, token: ManagedToken, app_id: str, password: str):
+        super().__init__(app_id, password)
+        self._token = token
+
+    def get_access_token(self, force_refresh: bool = False) -> str:
+        if not force_refresh and self._token.is_valid():
+            return self._token.access_token
+        # The connector asks synchronously, fall back to MSAL until the next refresh
+        return super().get_access_token(force_refresh)
+
+
+class TokenManager:
+    """Refreshes a set of tokens `margin` seconds before they expire."""
+
+    def __init__(self, margin: float = CONFIG.TOKEN_REFRESH_MARGIN):
+        self.margin = margin
+        self.tokens: dict[str, ManagedToken] = {}
+        self._tasks: list[asyncio.Task] = []
+
+    def add(self, token: ManagedToken) -> ManagedToken:
+        self.tokens[token.name] = token
+        return token
+
+    def start(self) -> None:
+        self._tasks = [
+            asyncio.create_task(self._keep_fresh(token), name=f"token-{token.name}")
+            for token in self.tokens.values()
+        ]
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        for token in self.tokens.values():
+            await token.close()
+
+    async def _keep_fresh(self, token: ManagedToken) -> None:
+        retry_delay = 1
+        while True:
+            try:
+                if not token.is_valid(self.margin):
+                    await token.refresh()
+                    print(
+                        f"Tokens: Refreshed {token.name} token in {token.last_refresh_latency:.3f}s"
+                    )
+                retry_delay = 1
+                await asyncio.sleep(
+                    max(1, token.expires_at - self.margin - time.time())
+                )
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Tokens: Error refreshing {token.name} token: {e}")
+                await asyncio.sleep(retry_delay)
+                retry_delay = min(retry_delay * 2, 60)
+
+    def stats(self) -> dict:
+        return {name: token.stats() for name, token in self.tokens.items()}
+
+
+TOKENS = TokenManager()
+stats.register("tokens", TOKENS.stats)
+
+GRAPH_TOKEN = TOKENS.add(
+    ManagedToken(
+        "graph",
+        CONFIG.TENANT_ID,
+        CONFIG.APP_ID,
+        CONFIG.APP_PASSWORD,
+        "https://graph.microsoft.com/.default",
+    )
+)
+
+BOT_TOKEN = TOKENS.add(
+    ManagedToken(
+        "bot",
+        "botframework.com",
+        CONFIG.APP_ID,
+        CONFIG.APP_PASSWORD,
+        "https://api.botframework.com/.default",
+    )
+)
@@ -1,17 +1,53 @@
+import asyncio
+import hashlib
+
 import jwt
 
 from config import DefaultConfig
+from utils import stats
+from utils.cache import TtlLruCache
+from utils.jwks import JwksCache, url_key_source
 
 CONFIG = DefaultConfig()
 
+DISCOVERY_URL = "https://login.microsoftonline.com/common/discovery/keys"
+
+# Shared by all requests so the signing keys are only downloaded when they change
+GRAPH_JWKS = JwksCache(url_key_source(DISCOVERY_URL))
+
+# Digests of tokens that already passed validation, kept until the token expires
+VALIDATED_TOKENS = TtlLruCache(max_size=CONFIG.VALIDATED_TOKENS_CACHE_SIZE)
+stats.register("graph_validation_tokens", VALIDATED_TOKENS.stats)
+stats.register("graph_jwks", GRAPH_JWKS.stats)
+
+
+def _token_digest(token: str) -> str:
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
 
-def validate_token(token: str) -> bool:
+def validate_token(token: str, jwks: JwksCache = GRAPH_JWKS) -> bool:
     """Validates the JWT token signature and checks the appid."""
     # https://learn.microsoft.com/en-us/graph/change-notifications-with-resource-data#how-to-validate
 
-    discovery_url = f"https://login.microsoftonline.com/common/discovery/keys"
-    jwks_client = jwt.PyJWKClient(discovery_url)
-    key = jwks_client.get_signing_key_from_jwt(token)
+    digest = _token_digest(token)
+    if VALIDATED_TOKENS.get(digest):
+        return True
+    return _validate_token(token, digest, jwks)
+
+
+async def validate_token_async(token: str, jwks: JwksCache = GRAPH_JWKS) -> bool:
+    """
+    Like validate_token, but a token that isn't cached is verified in a thread so a key
+    download or the RS256 verification doesn't block the event loop.
+    """
+    digest = _token_digest(token)
+    if VALIDATED_TOKENS.get(digest):
+        return True
+    return await asyncio.to_thread(_validate_token, token, digest, jwks)
+
+
+def _validate_token(token: str, digest: str, jwks: JwksCache) -> bool:
+    key = jwks.get_signing_key_from_jwt(token)
 
     try:
         payload = jwt.decode(
@@ -32,6 +68,7 @@ def validate_token(token: str) -> bool:
         if payload.get("appid") != "0bf30f3b-4a52-48df-9a82-234910c4a086":
             print(f"Invalid appid in token: {payload.get('appid')}")
             return False
+        VALIDATED_TOKENS.set(digest, True, expires_at=payload["exp"])
         return True
     except Exception as e:
         print(f"Error validating token: {e}")
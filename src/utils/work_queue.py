@@ -0,0 +1,94 @@
+"""
+Bounded asyncio queue with a pool of consumers, used to process work after the HTTP
+request that delivered it has been answered.
+"""
+
+import asyncio
+import time
+from typing import Any, Awaitable, Callable
+
+
+class WorkQueue:
+    """A bounded queue drained by a fixed number of asyncio consumer tasks."""
+
+    def __init__(
+        self,
+        name: str,
+        handler: Callable[[Any], Awaitable[Any]],
+        consumers: int,
+        max_size: int,
+        put_timeout: float,
+    ):
+        self.name = name
+        self._handler = handler
+        self._consumers = consumers
+        self._put_timeout = put_timeout
+        self._queue: asyncio.Queue | None = None
+        self._max_size = max_size
+        self._tasks: list[asyncio.Task] = []
+        self.processed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.max_wait = 0.0
+
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks)
+
+    def start(self) -> None:
+        self._queue = asyncio.Queue(maxsize=self._max_size)
+        self._tasks = [
+            asyncio.create_task(self._consume(), name=f"{self.name}-{i}")
+            for i in range(self._consumers)
+        ]
+        print(f"Queue: Started {self.name} with {self._consumers} consumers")
+
+    async def stop(self, timeout: float) -> None:
+        """Wait up to `timeout` seconds for queued items to be processed, then stop."""
+        if not self._tasks:
+            return
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            print(f"Queue: {self.name} stopped with {self._queue.qsize()} items left")
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def put(self, item: Any, timeout: float | None = -1) -> bool:
+        """
+        Enqueue an item. Returns False if the queue stayed full for `timeout` seconds
+        (`put_timeout` by default, None to wait forever).
+        """
+        if timeout == -1:
+            timeout = self._put_timeout
+        try:
+            await asyncio.wait_for(self._queue.put((time.monotonic(), item)), timeout)
+            return True
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            return False
+
+    async def _consume(self) -> None:
+        while True:
+            enqueued_at, item = await self._queue.get()
+            self.max_wait = max(self.max_wait, time.monotonic() - enqueued_at)
+            try:
+                await self._handler(item)
+                self.processed += 1
+            except Exception as e:
+                self.failed += 1
+                print(f"Queue: Error processing item in {self.name}: {e}")
+            finally:
+                self._queue.task_done()
+
+    def stats(self) -> dict:
+        return {
+            "depth": self._queue.qsize() if self._queue else 0,
+            "max_size": self._max_size,
+            "processed": self.processed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "max_wait": self.max_wait,
+        }
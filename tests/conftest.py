@@ -0,0 +1,6 @@
+import os
+import sys
+
+# The modules read their configuration at import time
+os.environ.setdefault("WebhookUrl", "https://localhost")
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
@@ -0,0 +1,68 @@
+import asyncio
+
+import pytest
+
+from bots.commands import CommandRouter
+from bots.teams_conversation_bot import COMMANDS
+
+
+@pytest.mark.parametrize(
+    "text, handler",
+    [
+        ("mention me", "_mention_adaptive_card_activity"),
+        ("mention bot", "_mention_bot_activity"),
+        ("mention", "_mention_activity"),
+        ("please mention me and the bot", "_mention_adaptive_card_activity"),
+        ("mention the bot", "_mention_activity"),
+        ("hi", "_hi"),
+        ("hi there", "_echo"),
+        ("updatecardaction", "_update_card"),
+        ("messageallmembers", "_message_all_members"),
+        ("whoami", "_get_member"),
+        ("deletecard", "_delete_card_activity"),
+        # Several commands in one message: same priority as the original if/elif chain
+        ("who will get the message", "_message_all_members"),
+        ("delete the mention", "_mention_activity"),
+        ("delete the update", "_update_card"),
+        ("who is mentioned", "_mention_activity"),
+        ("delete who", "_get_member"),
+        ("nothing to do", "_echo"),
+    ],
+)
+def test_bot_command_priority(text, handler):
+    assert COMMANDS.match(text).handler.__name__ == handler
+
+
+def test_first_registered_command_wins():
+    router = CommandRouter()
+
+    async def first(bot, turn_context):
+        pass
+
+    async def second(bot, turn_context):
+        pass
+
+    async def third(bot, turn_context):
+        pass
+
+    router.command("b")(first)
+    router.command("a b c")(second)
+    router.command("a", match="prefix")(third)
+    assert router.match("a b c").handler is third
+    assert router.match("x a b c").handler is first
+    assert router.match("x\nb").handler is first
+    assert router.match("x") is None
+
+
+def test_dispatch_counts_calls():
+    router = CommandRouter()
+    calls = []
+
+    @router.command("go")
+    async def go(bot, turn_context):
+        calls.append(turn_context)
+
+    assert asyncio.run(router.dispatch(None, "turn", "let's go"))
+    assert not asyncio.run(router.dispatch(None, "turn", "stop"))
+    assert calls == ["turn"]
+    assert router.stats()["contains:go"]["calls"] == 1
@@ -0,0 +1,64 @@
+import asyncio
+
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestClient, TestServer
+
+from api.graph.subscriptions import _read_chat_ids
+
+
+async def _echo_chat_ids(req: web.Request) -> web.Response:
+    return web.json_response(await _read_chat_ids(req))
+
+
+def post(body: bytes, content_type: str = "application/json"):
+    async def run():
+        app = web.Application()
+        app.router.add_post("/", _echo_chat_ids)
+        async with TestClient(TestServer(app)) as client:
+            response = await client.post(
+                "/", data=body, headers={"Content-Type": content_type}
+            )
+            if response.status == 200:
+                return response.status, await response.json()
+            return response.status, await response.text()
+
+    return asyncio.run(run())
+
+
+@pytest.mark.parametrize(
+    "body, expected",
+    [
+        (b'{"chat_ids": ["19:a", "19:b"]}', ["19:a", "19:b"]),
+        (b'["19:a", "19:b"]', ["19:a", "19:b"]),
+        (b'{"chat_ids": []}', []),
+    ],
+)
+def test_read_chat_ids_json(body, expected):
+    assert post(body) == (200, expected)
+
+
+def test_read_chat_ids_lines():
+    assert post(b"19:a\n\n19:b\n", "text/plain") == (200, ["19:a", "19:b"])
+
+
+@pytest.mark.parametrize(
+    "body",
+    [
+        b"not json",
+        b"null",
+        b"42",
+        b'"19:a"',
+        b"{}",
+        b'{"chat_ids": null}',
+        b'{"chat_ids": 42}',
+        b'{"chat_ids": "19:a"}',
+        b"[1, 2]",
+        b'["19:a", null]',
+        b'["19:a", ""]',
+        b'{"chat_ids": [["19:a"]]}',
+    ],
+)
+def test_read_chat_ids_rejects_invalid_bodies(body):
+    status, _ = post(body)
+    assert status == 400